@@ -9,7 +9,11 @@ import uuid
 # Load environment variables
 load_dotenv()
 
+from response_encoding import FastJSONProvider, response_compressor
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson serialization, msgpack on request
+response_compressor.init_app(app)  # brotli/gzip for larger responses
 CORS(app)  # Enable CORS for all routes
 
 # Configuration
@@ -21,6 +25,7 @@ from routes.reports import reports_bp
 from routes.notifications import notifications_bp
 from routes.upload import upload_bp
 from routes.email_management import email_bp
+from circuit_breaker import supabase_breaker
 
 # Register blueprints
 app.register_blueprint(ai_bp, url_prefix='/api')
@@ -32,6 +37,13 @@ app.register_blueprint(email_bp, url_prefix='/api/email')
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """API Health Check endpoint"""
+    if not os.getenv('SUPABASE_URL'):
+        database_status = 'misconfigured'
+    elif supabase_breaker.state != 'closed':
+        database_status = 'unavailable'
+    else:
+        database_status = 'healthy'
+    
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
@@ -41,7 +53,10 @@ def health_check():
             'email': 'healthy' if os.getenv('BREVO_API_KEY') else 'misconfigured',
             'whatsapp': 'healthy' if os.getenv('TWILIO_ACCOUNT_SID') else 'misconfigured',
             'google_maps': 'healthy' if os.getenv('GOOGLE_MAPS_API_KEY') else 'misconfigured',
-            'database': 'healthy' if os.getenv('SUPABASE_URL') else 'misconfigured'
+            'database': database_status
+        },
+        'circuit_breakers': {
+            'supabase': supabase_breaker.stats()
         }
     })
 
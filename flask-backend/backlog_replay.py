@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+from report_store import report_store, FileLock
+from circuit_breaker import CircuitOpenError
+from geo import report_point
+
+
+class BacklogReplayer:
+    """Replays reports saved to the fallback store back into Supabase once it is healthy
+
+    The replayer walks the store's append-only log from a checkpoint, sends
+    records to the ``reports`` table as multi-row upserts keyed on ``id`` and
+    advances the checkpoint after every batch, so a crash only repeats the
+    batch that was in flight. Notification rows that could not be logged
+    while the database was down are backfilled afterwards. A row PostgREST
+    rejects outright is moved to a dead-letter file so it cannot hold the
+    checkpoint back.
+    """
+
+    def __init__(self, store=None, batch_size=None, interval_seconds=None):
+        self.store = store or report_store
+        self.batch_size = batch_size or int(os.getenv('REPLAY_BATCH_SIZE', 500))
+        self.interval_seconds = interval_seconds or float(os.getenv('REPLAY_INTERVAL_SECONDS', 30))
+        self.checkpoint_file = os.path.join(self.store.store_dir, 'replay_checkpoint.json')
+        self.dead_letter_file = os.path.join(self.store.store_dir, 'replay_dead_letter.jsonl')
+
+        self.client = None
+        self.breaker = None
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self._last_run = None
+
+    def configure(self, client, breaker=None):
+        """Set the Supabase client used for health checks and inserts"""
+        self.client = client
+        self.breaker = breaker
+
+    def ensure_started(self):
+        """Start the background replay thread once per process"""
+        pid = os.getpid()
+        if self._started_pid == pid or self.client is None:
+            return
+
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            threading.Thread(target=self._run_loop, name='backlog-replay', daemon=True).start()
+            self._started_pid = pid
+
+    def is_database_healthy(self):
+        """Cheap probe query against the reports table"""
+        # While the circuit is open its own prober is already watching the database
+        if self.breaker is not None and self.breaker.state != 'closed':
+            return False
+        try:
+            self.client.table('reports').select('id').limit(1).execute()
+            return True
+        except Exception as e:
+            print(f"[Replay] Database still unavailable: {e}")
+            return False
+
+    def has_backlog(self):
+        checkpoint = self._load_checkpoint()
+        return (tuple(checkpoint['reports']) < self.store.position()
+                or checkpoint['notifications'] < self.store.notifications_position())
+
+    def status(self):
+        checkpoint = self._load_checkpoint()
+        return {
+            'checkpoint': checkpoint,
+            'store_position': list(self.store.position()),
+            'backlog': self.has_backlog(),
+            'batch_size': self.batch_size,
+            'last_run': self._last_run
+        }
+
+    def replay_once(self):
+        """Replay everything past the checkpoint; returns counters for this pass"""
+        stats = {'reports': 0, 'notifications': 0, 'skipped': 0, 'dead_lettered': 0}
+
+        # Only one process replays at a time; the others simply skip this pass
+        lock = FileLock(os.path.join(self.store.store_dir, 'replay.lock'))
+        if not lock.acquire(blocking=False):
+            return stats
+
+        try:
+            checkpoint = self._load_checkpoint()
+
+            # Fix the notification end point first so every row we backfill
+            # belongs to a report that is replayed in this pass
+            notifications_end = self.store.notifications_position()
+            reports_end = self.store.position()
+
+            batch = {}
+            position = tuple(checkpoint['reports'])
+            for record_position, next_position, record in self.store.iter_log(position, reports_end):
+                # Older versions are superseded by a later record in the log
+                if not self.store.is_latest(record['id'], record_position):
+                    stats['skipped'] += 1
+                else:
+                    batch[record['id']] = self._to_row(record)
+
+                position = next_position
+                if len(batch) >= self.batch_size:
+                    stats['reports'] += self._flush_reports(batch, stats)
+                    checkpoint['reports'] = list(position)
+                    self._save_checkpoint(checkpoint)
+                    batch = {}
+
+            if batch:
+                stats['reports'] += self._flush_reports(batch, stats)
+            checkpoint['reports'] = list(position)
+            self._save_checkpoint(checkpoint)
+
+            rows = []
+            offset = checkpoint['notifications']
+            for offset, row in self.store.iter_notifications(offset, notifications_end):
+                rows.append(row)
+                if len(rows) >= self.batch_size:
+                    stats['notifications'] += self._write('notifications', rows, self._insert_notifications, stats)
+                    checkpoint['notifications'] = offset
+                    self._save_checkpoint(checkpoint)
+                    rows = []
+
+            if rows:
+                stats['notifications'] += self._write('notifications', rows, self._insert_notifications, stats)
+            checkpoint['notifications'] = max(offset, checkpoint['notifications'])
+            self._save_checkpoint(checkpoint)
+        finally:
+            lock.release()
+
+        self._last_run = {'finished_at': datetime.now().isoformat(), **stats}
+        if stats['reports'] or stats['notifications']:
+            print(f"[Replay] Replayed {stats['reports']} reports and {stats['notifications']} notifications")
+        if stats['dead_lettered']:
+            print(f"[Replay] Moved {stats['dead_lettered']} rejected rows to {self.dead_letter_file}")
+        return stats
+
+    def _flush_reports(self, batch, stats):
+        rows = list(batch.values())
+        # Multi-row upserts need identical keys; older records may lack newer columns
+        columns = set().union(*(row.keys() for row in rows))
+        for row in rows:
+            for column in columns:
+                row.setdefault(column, None)
+        return self._write('reports', rows, self._upsert_reports, stats)
+
+    def _upsert_reports(self, rows):
+        return self.client.table('reports').upsert(rows, on_conflict='id').execute()
+
+    def _insert_notifications(self, rows):
+        return self.client.table('notifications').insert(rows).execute()
+
+    def _write(self, table, rows, write, stats):
+        """Send rows with write(rows) through the breaker; returns how many were written
+
+        When PostgREST rejects the batch, the rows are retried one at a time
+        and those rejected again are dead-lettered. Outages, including an open
+        circuit, propagate so the checkpoint stays where it is.
+        """
+        try:
+            self._execute(write, rows)
+            return len(rows)
+        except Exception as e:
+            if not self._is_rejection(e):
+                raise
+            print(f"[Replay] {table} batch of {len(rows)} rejected, retrying row by row: {e}")
+
+        written = 0
+        for row in rows:
+            try:
+                self._execute(write, [row])
+                written += 1
+            except Exception as e:
+                if not self._is_rejection(e):
+                    raise
+                self._dead_letter(table, row, e)
+                stats['dead_lettered'] += 1
+        return written
+
+    def _execute(self, write, rows):
+        if self.breaker is None:
+            return write(rows)
+        return self.breaker.call(write, rows)
+
+    def _is_rejection(self, error):
+        """True if the database answered and refused the rows, rather than being unreachable"""
+        if isinstance(error, CircuitOpenError) or self.breaker is None:
+            return False
+        return not self.breaker.is_failure(error)
+
+    def _dead_letter(self, table, row, error):
+        entry = {'table': table, 'row': row, 'error': str(error), 'failed_at': datetime.now().isoformat()}
+        with open(self.dead_letter_file, 'a') as f:
+            f.write(json.dumps(entry, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _to_row(self, record):
+        """Strip store-only fields before sending a record to PostgREST"""
+        # updated_at is left to the database so delta sync clients see replayed rows as new changes
+        row = {key: value for key, value in record.items() if not key.startswith('_') and key != 'updated_at'}
+        # Fill the lat/lng columns that bbox and radius queries use from whichever form the record has
+        point = report_point(record)
+        if point is not None:
+            row['lat'], row['lng'] = point
+        return row
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'reports': [1, 0], 'notifications': 0}
+
+    def _save_checkpoint(self, checkpoint):
+        tmp_path = f"{self.checkpoint_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_file)
+
+    def _run_loop(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            try:
+                if self.has_backlog() and self.is_database_healthy():
+                    self.replay_once()
+            except Exception as e:
+                print(f"[Replay] Replay pass failed: {e}")
+
+
+# Global replayer instance
+backlog_replayer = BacklogReplayer()
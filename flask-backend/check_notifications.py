@@ -29,20 +29,19 @@ def check_notifications_status():
     
     print("💾 Data Storage:")
     print("   ⚠️  Database: Not available (needs Supabase schema setup)")
-    print("   ✅ Backup: Saved to reports_backup.json")
+    print("   ✅ Backup: Saved to the local report store")
     print()
     
-    # Check if backup file was created
-    backup_file = 'reports_backup.json'
-    if os.path.exists(backup_file):
-        import json
-        with open(backup_file, 'r') as f:
-            reports = json.load(f)
-        print(f"   📁 Backup file contains: {len(reports)} report(s)")
-        print(f"   📄 Latest report ID: {reports[-1]['id']}")
-        print(f"   📍 Location: {reports[-1]['location']}")
+    # Check the fallback report store
+    from report_store import report_store
+    total = report_store.count()
+    if total:
+        latest = next(report_store.iter_reports())
+        print(f"   📁 Report store contains: {total} report(s)")
+        print(f"   📄 Latest report ID: {latest['id']}")
+        print(f"   📍 Location: {latest['location']}")
     else:
-        print("   ❌ Backup file not found")
+        print("   ❌ Report store is empty")
     
     print()
     print("🎯 Next Steps:")
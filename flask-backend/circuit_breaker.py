@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+from datetime import datetime
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Fast-fail wrapper around calls to an unreliable dependency
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    every call raises CircuitOpenError immediately, so callers go straight
+    to their fallback. While open, a background thread runs the probe every
+    ``reset_timeout`` seconds (half-open); the first successful probe closes
+    the circuit again. Request threads never wait on a probe. The prober is
+    started per process, so a worker forked while the circuit was open
+    starts its own on first use instead of staying open forever.
+
+    ``fn`` should build its request as well as send it, so that any failure
+    along the way counts against the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, is_failure=None):
+        self.name = name
+        prefix = f"CIRCUIT_{name.upper()}"
+        self.failure_threshold = failure_threshold or int(os.getenv(f'{prefix}_FAILURE_THRESHOLD', 3))
+        self.reset_timeout = reset_timeout or float(os.getenv(f'{prefix}_RESET_SECONDS', 10))
+        self.is_failure = is_failure or (lambda error: True)
+
+        self.probe = None
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._last_error = None
+        self._lock = threading.Lock()
+        self._prober_pid = None
+        self._stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def set_probe(self, probe):
+        """Register a cheap callable used to test the dependency while the circuit is open"""
+        self.probe = probe
+
+    @property
+    def state(self):
+        if self._state != self.CLOSED and self._prober_pid != os.getpid():
+            with self._lock:
+                self._ensure_prober()
+        return self._state
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker, raising CircuitOpenError while open"""
+        with self._lock:
+            if self._state != self.CLOSED:
+                self._ensure_prober()
+                self._stats['rejected'] += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self._stats['calls'] += 1
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+
+        self.record_success()
+        return result
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+
+    def record_failure(self, error):
+        with self._lock:
+            self._failures += 1
+            self._stats['failures'] += 1
+            self._last_error = str(error)
+            if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'consecutive_failures': self._failures,
+                'opened_at': datetime.fromtimestamp(self._opened_at).isoformat() if self._opened_at else None,
+                'last_error': self._last_error,
+                **self._stats
+            }
+
+    def _open(self):
+        """Trip the circuit and make sure a prober is running; caller holds the lock"""
+        self._state = self.OPEN
+        self._opened_at = time.time()
+        self._stats['opened'] += 1
+        print(f"[CircuitBreaker] {self.name} circuit opened after {self._failures} failures: {self._last_error}")
+        self._ensure_prober()
+
+    def _ensure_prober(self):
+        """Start this process's probe thread unless it is already running; caller holds the lock"""
+        if self._state != self.CLOSED and self._prober_pid != os.getpid():
+            self._prober_pid = os.getpid()
+            threading.Thread(target=self._probe_loop, name=f'{self.name}-probe', daemon=True).start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.reset_timeout)
+
+            with self._lock:
+                if self._state == self.CLOSED:
+                    self._prober_pid = None
+                    return
+                self._state = self.HALF_OPEN
+
+            try:
+                if self.probe is not None:
+                    self.probe()
+            except Exception as e:
+                with self._lock:
+                    self._state = self.OPEN
+                    self._last_error = str(e)
+                continue
+
+            with self._lock:
+                self._state = self.CLOSED
+                self._failures = 0
+                self._opened_at = None
+                self._prober_pid = None
+            print(f"[CircuitBreaker] {self.name} circuit closed")
+            return
+
+
+def _is_supabase_outage(error):
+    """PostgREST answering with an SQL error means the database is reachable"""
+    return type(error).__name__ != 'APIError'
+
+
+# Global breaker for the Supabase client
+supabase_breaker = CircuitBreaker('supabase', is_failure=_is_supabase_outage)
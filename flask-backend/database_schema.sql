@@ -33,11 +33,54 @@ CREATE TABLE IF NOT EXISTS public.notifications (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Link near-duplicate reports to the first report of the same incident
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS duplicate_of UUID REFERENCES public.reports(id) ON DELETE SET NULL;
+
+-- Plain lat/lng columns for map viewport (bbox) and radius queries
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION;
+ALTER TABLE public.reports ADD COLUMN IF NOT EXISTS lng DOUBLE PRECISION;
+
+-- Backfill lat/lng from coordinates stored as "(lng, lat)" strings or {lat, lng} objects
+UPDATE public.reports SET
+  lng = split_part(trim(both '()' from coordinates #>> '{}'), ',', 1)::DOUBLE PRECISION,
+  lat = split_part(trim(both '()' from coordinates #>> '{}'), ',', 2)::DOUBLE PRECISION
+WHERE lat IS NULL AND jsonb_typeof(coordinates) = 'string';
+
+UPDATE public.reports SET
+  lat = (coordinates->>'lat')::DOUBLE PRECISION,
+  lng = (coordinates->>'lng')::DOUBLE PRECISION
+WHERE lat IS NULL AND jsonb_typeof(coordinates) = 'object';
+
+-- Delta sync (/api/reports/changes) relies on every row having updated_at
+UPDATE public.reports SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_reports_status ON public.reports(status);
 CREATE INDEX IF NOT EXISTS idx_reports_created_at ON public.reports(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_reports_urgency ON public.reports(urgency_level);
 CREATE INDEX IF NOT EXISTS idx_notifications_report_id ON public.notifications(report_id);
+CREATE INDEX IF NOT EXISTS idx_reports_duplicate_of ON public.reports(duplicate_of) WHERE duplicate_of IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_reports_updated_at_id ON public.reports(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_reports_active_lat_lng ON public.reports(lat, lng) WHERE status = 'active';
+
+-- Full-text search (/api/reports/search): location terms weigh more than description terms
+CREATE OR REPLACE FUNCTION report_search_vector(description TEXT, location TEXT)
+RETURNS tsvector AS $$
+  SELECT setweight(to_tsvector('english', coalesce(location, '')), 'A') ||
+         setweight(to_tsvector('english', coalesce(description, '')), 'B');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS idx_reports_search ON public.reports USING GIN (report_search_vector(description, location));
+
+CREATE OR REPLACE FUNCTION search_reports(search_query TEXT, status_filter TEXT DEFAULT NULL, max_results INTEGER DEFAULT 20)
+RETURNS TABLE (report JSONB, rank REAL) AS $$
+  SELECT to_jsonb(r), ts_rank_cd(report_search_vector(r.description, r.location), q) AS rank
+  FROM public.reports r, websearch_to_tsquery('english', search_query) q
+  WHERE report_search_vector(r.description, r.location) @@ q
+    AND (status_filter IS NULL OR r.status = status_filter)
+  ORDER BY rank DESC, r.created_at DESC
+  LIMIT max_results;
+$$ LANGUAGE sql STABLE;
 
 -- Enable Row Level Security (RLS)
 ALTER TABLE public.reports ENABLE ROW LEVEL SECURITY;
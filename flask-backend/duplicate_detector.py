@@ -0,0 +1,122 @@
+import os
+import re
+import time
+import zlib
+import threading
+from collections import deque
+
+from geo import SpatialGrid
+
+
+class DuplicateDetector:
+    """Finds recent active reports that likely describe the same animal
+
+    Recent reports are kept in a spatial grid whose cells are as large as
+    the match radius, so a lookup only visits the 3x3 block of cells around
+    the new report. Candidates inside the time window are compared on
+    hashed character shingles of their descriptions (Jaccard similarity).
+    Reports older than the window fall out of the index as new ones arrive.
+    """
+
+    def __init__(self, radius_km=None, window_minutes=None, threshold=None):
+        self.radius_km = radius_km or float(os.getenv('DUPLICATE_RADIUS_KM', 0.5))
+        self.window_seconds = (window_minutes or float(os.getenv('DUPLICATE_WINDOW_MINUTES', 120))) * 60
+        self.threshold = threshold or float(os.getenv('DUPLICATE_SIMILARITY', 0.3))
+        self.enabled = os.getenv('DUPLICATE_DETECTION', 'true').lower() != 'false'
+
+        self.grid = SpatialGrid(cell_km=self.radius_km)
+        self._entries = {}       # id -> (created_ts, shingles, canonical_id, animal_type)
+        self._by_time = deque()  # (created_ts, id) in arrival order
+        self._lock = threading.Lock()
+        self._warmed = False
+
+    @staticmethod
+    def shingles(text, size=4):
+        """Hashed character shingles of the normalized text"""
+        words = re.findall(r'\w+', (text or '').lower())
+        shingles = set()
+        for word in words:
+            padded = f" {word} "
+            if len(padded) <= size:
+                shingles.add(zlib.crc32(padded.encode('utf-8')))
+                continue
+            for i in range(len(padded) - size + 1):
+                shingles.add(zlib.crc32(padded[i:i + size].encode('utf-8')))
+        return frozenset(shingles)
+
+    def warm(self, reports):
+        """Index recent reports loaded at startup; each needs id, coordinates, description, created_ts"""
+        with self._lock:
+            for report in sorted(reports, key=lambda r: r['created_ts']):
+                self._add(report['id'], report['lat'], report['lng'], report['description'],
+                          report['created_ts'], report.get('duplicate_of'), report.get('animal_type'))
+            self._warmed = True
+
+    @property
+    def warmed(self):
+        return self._warmed
+
+    def find_duplicate(self, lat, lng, description, animal_type=None, now=None):
+        """Return (canonical_id, similarity, distance_km) for the best match, or None"""
+        if not self.enabled:
+            return None
+
+        now = now or time.time()
+        signature = self.shingles(description)
+        if not signature:
+            return None
+
+        best = None
+        with self._lock:
+            self._expire(now)
+            for report_id, distance in self.grid.query_radius(lat, lng, self.radius_km):
+                created_ts, other, canonical_id, other_animal = self._entries[report_id]
+                if animal_type and other_animal and animal_type != other_animal:
+                    continue
+
+                similarity = len(signature & other) / len(signature | other)
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (canonical_id or report_id, similarity, distance)
+
+        return best
+
+    def add(self, report_id, lat, lng, description, duplicate_of=None, animal_type=None, created_ts=None):
+        """Index a newly saved report; reports already indexed are left as they are"""
+        with self._lock:
+            if report_id in self._entries:
+                return
+            self._add(report_id, lat, lng, description, created_ts or time.time(), duplicate_of, animal_type)
+
+    def remove(self, report_id):
+        """Drop a report that is no longer active"""
+        with self._lock:
+            self._entries.pop(report_id, None)
+            self.grid.remove(report_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'indexed_reports': len(self._entries),
+                'occupied_cells': len(self.grid.cells),
+                'radius_km': self.radius_km,
+                'window_minutes': self.window_seconds / 60,
+                'threshold': self.threshold
+            }
+
+    def _add(self, report_id, lat, lng, description, created_ts, duplicate_of, animal_type):
+        self._entries[report_id] = (created_ts, self.shingles(description), duplicate_of, animal_type)
+        self._by_time.append((created_ts, report_id))
+        self.grid.add(report_id, lat, lng)
+
+    def _expire(self, now):
+        cutoff = now - self.window_seconds
+        while self._by_time and self._by_time[0][0] < cutoff:
+            created_ts, report_id = self._by_time.popleft()
+            entry = self._entries.get(report_id)
+            if entry is not None and entry[0] == created_ts:
+                del self._entries[report_id]
+                self.grid.remove(report_id)
+
+
+# Global detector instance
+duplicate_detector = DuplicateDetector()
@@ -7,6 +7,9 @@ from email import encoders
 from datetime import datetime
 import json
 import os
+import threading
+from contextlib import contextmanager
+from geo import report_point
 
 class EmailService:
     """Simple email service using Gmail SMTP with built-in Python libraries only"""
@@ -18,10 +21,26 @@ class EmailService:
         self.from_email = os.getenv('EMAIL_USER', 'speedblast069@gmail.com')
         self.app_password = os.getenv('EMAIL_PASS', 'rdbc ianf bqzl uoao')
         self.sender_name = os.getenv('EMAIL_SENDER_NAME', 'RescueRadar Team')
+        # Outbox workers send concurrently; serialize the log file rewrite
+        self._log_lock = threading.Lock()
         print(f"[EmailService] Initialized with {self.from_email} on {self.smtp_server}:{self.smtp_port}")
     
-    def send_email(self, to_email, subject, html_content, text_content=None, attachments=None):
-        """Send email using Gmail SMTP"""
+    @contextmanager
+    def smtp_session(self):
+        """Open one authenticated SMTP connection to send several emails over"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        try:
+            server.starttls()
+            server.login(self.from_email, self.app_password)
+            yield server
+        finally:
+            try:
+                server.quit()
+            except smtplib.SMTPException:
+                server.close()
+    
+    def send_email(self, to_email, subject, html_content, text_content=None, attachments=None, connection=None):
+        """Send email using Gmail SMTP, reusing an open connection when one is given"""
         try:
             print(f"[EmailService] Sending email to: {to_email}")
             print(f"[EmailService] Using from: {self.from_email}")
@@ -45,10 +64,13 @@ class EmailService:
                     self._add_attachment(msg, attachment)
             
             # Send email using SMTP with TLS
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()  # Enable TLS encryption
-                server.login(self.from_email, self.app_password)
-                server.send_message(msg)
+            if connection is not None:
+                connection.send_message(msg)
+            else:
+                with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                    server.starttls()  # Enable TLS encryption
+                    server.login(self.from_email, self.app_password)
+                    server.send_message(msg)
             print(f"[EmailService] Email sent successfully to {to_email}")
             
             result = {
@@ -135,20 +157,21 @@ class EmailService:
             
             # Log to file
             log_file = 'email_log.json'
-            try:
-                with open(log_file, 'r') as f:
-                    logs = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                logs = []
-            
-            logs.append(log_entry)
-            
-            # Keep only last 1000 logs
-            if len(logs) > 1000:
-                logs = logs[-1000:]
-            
-            with open(log_file, 'w') as f:
-                json.dump(logs, f, indent=2)
+            with self._log_lock:
+                try:
+                    with open(log_file, 'r') as f:
+                        logs = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    logs = []
+                
+                logs.append(log_entry)
+                
+                # Keep only last 1000 logs
+                if len(logs) > 1000:
+                    logs = logs[-1000:]
+                
+                with open(log_file, 'w') as f:
+                    json.dump(logs, f, indent=2)
                 
         except Exception as e:
             print(f"Failed to log email: {e}")
@@ -156,8 +179,8 @@ class EmailService:
 # Global email service instance
 email_service = EmailService()
 
-def send_rescue_team_email(report_id, report_data):
-    """Send professional email notification to rescue team"""
+def send_rescue_team_email(report_id, report_data, connection=None, recipient=None, team=None):
+    """Send professional email notification to rescue team (the routed team, or the default address)"""
     try:
         # Format date and time
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -173,11 +196,14 @@ def send_rescue_team_email(report_id, report_data):
         
         # Get location map URL if coordinates are available
         map_url = ""
-        if 'coordinates' in report_data and report_data['coordinates']:
-            lat = report_data['coordinates'].get('lat')
-            lng = report_data['coordinates'].get('lng')
-            if lat and lng:
-                map_url = f"https://www.google.com/maps?q={lat},{lng}"
+        point = report_point(report_data)
+        if point:
+            lat, lng = point
+            map_url = f"https://www.google.com/maps?q={lat},{lng}"
+        
+        team_line = ""
+        if team:
+            team_line = f"<p><strong>Routed to:</strong> {team.get('name', 'your team')} ({team.get('distance_km')} km away)</p>"
         
         subject = f"🆘 {urgency_level}: Animal Rescue Report #{report_id[:8]}"
         
@@ -287,6 +313,7 @@ def send_rescue_team_email(report_id, report_data):
                 <div class="section">
                     <h3 class="section-title">📍 Incident Location</h3>
                     <p><strong>Address:</strong> {report_data.get('location', 'Location not specified')}</p>
+                    {team_line}
                     {f'<p><strong>Coordinates:</strong> {lat}, {lng}</p>' if 'lat' in locals() and 'lng' in locals() else ''}
                     {f'<a href="{map_url}" class="btn" target="_blank">View on Map</a>' if map_url else ''}
                 </div>
@@ -340,9 +367,9 @@ def send_rescue_team_email(report_id, report_data):
         </html>
         """
         
-        # Send to configured rescue email
-        rescue_email = 'siesgauravpatil@gmail.com'  # This should be replaced with actual rescue team email
-        result = email_service.send_email(rescue_email, subject, html_content)
+        # Send to the routed team, or the configured rescue email when no team is in range
+        rescue_email = recipient or os.getenv('DEFAULT_RESCUE_EMAIL', 'siesgauravpatil@gmail.com')
+        result = email_service.send_email(rescue_email, subject, html_content, connection=connection)
         
         return result
         
@@ -353,7 +380,7 @@ def send_rescue_team_email(report_id, report_data):
             'error': str(e)
         }
 
-def send_user_confirmation_email(email, report_id, report_data):
+def send_user_confirmation_email(email, report_id, report_data, connection=None):
     """Send email confirmation to user using enhanced service"""
     try:
         subject = f"✅ Report Confirmation - #{report_id[:8]}"
@@ -397,7 +424,7 @@ def send_user_confirmation_email(email, report_id, report_data):
         </div>
         """
         
-        result = email_service.send_email(email, subject, html_content)
+        result = email_service.send_email(email, subject, html_content, connection=connection)
         
         return result
         
@@ -407,6 +434,23 @@ def send_user_confirmation_email(email, report_id, report_data):
             'error': str(e)
         }
 
+def _send_over_one_session(send, payloads):
+    """Call an email sender for every payload over a single SMTP session"""
+    try:
+        with email_service.smtp_session() as server:
+            return [send(**payload, connection=server) for payload in payloads]
+    except Exception as e:
+        print(f"[EmailService] SMTP session failed: {e}")
+        return [{'success': False, 'method': 'gmail_smtp', 'error': str(e)} for _ in payloads]
+
+def send_rescue_team_emails(payloads):
+    """Send several rescue team alerts over one SMTP connection"""
+    return _send_over_one_session(send_rescue_team_email, payloads)
+
+def send_user_confirmation_emails(payloads):
+    """Send several user confirmations over one SMTP connection"""
+    return _send_over_one_session(send_user_confirmation_email, payloads)
+
 def send_test_email():
     """Send a realistic test rescue report email to Gaurav Patil"""
     try:
@@ -0,0 +1,202 @@
+import math
+import json
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def parse_coordinates(value):
+    """Return (lat, lng) from any stored coordinates format, or None
+
+    Reports carry coordinates as ``{'lat': .., 'lng': ..}`` dicts, as the
+    Postgres point string ``"(lng, lat)"`` written by save_report, or as a
+    JSON string of either.
+    """
+    if value is None:
+        return None
+
+    try:
+        if isinstance(value, dict):
+            lat, lng = float(value['lat']), float(value['lng'])
+        elif isinstance(value, str):
+            text = value.strip()
+            if text.startswith(('{', '"')):
+                return parse_coordinates(json.loads(text))
+            lng_text, lat_text = text.strip('()').split(',')
+            lat, lng = float(lat_text), float(lng_text)
+        else:
+            return None
+    except (KeyError, ValueError, TypeError):
+        return None
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def report_point(report):
+    """(lat, lng) of a reports row, preferring the lat/lng columns over coordinates"""
+    if report.get('lat') is not None and report.get('lng') is not None:
+        point = parse_coordinates({'lat': report['lat'], 'lng': report['lng']})
+        if point is not None:
+            return point
+    return parse_coordinates(report.get('coordinates'))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lng, precision=5):
+    """Standard base32 geohash of a point"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def bbox_around(lat, lng, radius_km):
+    """(min_lat, min_lng, max_lat, max_lng) of the box enclosing a circle"""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    dlng = dlat / max(math.cos(math.radians(lat)), 0.01)
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def parse_bbox(value):
+    """Parse a ``west,south,east,north`` string into (min_lat, min_lng, max_lat, max_lng)
+
+    Raises ValueError for malformed or out-of-range boxes.
+    """
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError('bbox must be west,south,east,north')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError('bbox is out of range or inverted')
+    return south, west, north, east
+
+
+def in_area(point, bbox=None, near=None):
+    """True if point lies inside the bbox and within (lat, lng, radius_km) of near, when given"""
+    if point is None:
+        return False
+    lat, lng = point
+    if bbox is not None and not (bbox[0] <= lat <= bbox[2] and bbox[1] <= lng <= bbox[3]):
+        return False
+    return near is None or haversine_km(near[0], near[1], lat, lng) <= near[2]
+
+
+class SpatialGrid:
+    """Uniform lat/lng grid index over point ids
+
+    Rows are ``cell_km`` tall; the width of a cell in degrees of longitude
+    grows with latitude so cells stay roughly square on the ground. Radius
+    and bounding-box queries only visit the cells that overlap the query.
+    """
+
+    def __init__(self, cell_km=1.0):
+        self.cell_km = cell_km
+        self.cell_lat = cell_km / KM_PER_DEGREE_LAT
+        self.cells = {}       # (row, col) -> {id: (lat, lng)}
+        self.positions = {}   # id -> (lat, lng, (row, col))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item_id):
+        return item_id in self.positions
+
+    def _row(self, lat):
+        return math.floor(lat / self.cell_lat)
+
+    def _cell_lng(self, row):
+        center_lat = (row + 0.5) * self.cell_lat
+        return self.cell_lat / max(math.cos(math.radians(center_lat)), 0.01)
+
+    def _key(self, lat, lng):
+        row = self._row(lat)
+        return row, math.floor(lng / self._cell_lng(row))
+
+    def add(self, item_id, lat, lng):
+        """Insert or move a point"""
+        self.remove(item_id)
+        key = self._key(lat, lng)
+        self.cells.setdefault(key, {})[item_id] = (lat, lng)
+        self.positions[item_id] = (lat, lng, key)
+
+    def remove(self, item_id):
+        """Remove a point if present"""
+        position = self.positions.pop(item_id, None)
+        if position is None:
+            return
+        cell = self.cells.get(position[2])
+        if cell is not None:
+            cell.pop(item_id, None)
+            if not cell:
+                del self.cells[position[2]]
+
+    def get(self, item_id):
+        """Return (lat, lng) for an id, or None"""
+        position = self.positions.get(item_id)
+        return position[:2] if position else None
+
+    def query_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """Yield (id, lat, lng) for every point inside the box"""
+        first_row, last_row = self._row(min_lat), self._row(max_lat)
+        ranges = {}
+        span = 0
+        for row in range(first_row, last_row + 1):
+            cell_lng = self._cell_lng(row)
+            ranges[row] = (math.floor(min_lng / cell_lng), math.floor(max_lng / cell_lng))
+            span += ranges[row][1] - ranges[row][0] + 1
+            if span > len(self.cells):
+                break
+
+        if span > len(self.cells):
+            # Box covers more cells than are occupied: walk the occupied ones instead
+            for (row, col), cell in list(self.cells.items()):
+                if first_row <= row <= last_row:
+                    cell_lng = self._cell_lng(row)
+                    if math.floor(min_lng / cell_lng) <= col <= math.floor(max_lng / cell_lng):
+                        yield from self._points_in_box(cell, min_lat, min_lng, max_lat, max_lng)
+            return
+
+        for row, (first_col, last_col) in ranges.items():
+            for col in range(first_col, last_col + 1):
+                cell = self.cells.get((row, col))
+                if cell:
+                    yield from self._points_in_box(cell, min_lat, min_lng, max_lat, max_lng)
+
+    def query_radius(self, lat, lng, radius_km):
+        """Yield (id, distance_km) for every point within radius_km"""
+        for item_id, point_lat, point_lng in self.query_bbox(*bbox_around(lat, lng, radius_km)):
+            distance = haversine_km(lat, lng, point_lat, point_lng)
+            if distance <= radius_km:
+                yield item_id, distance
+
+    @staticmethod
+    def _points_in_box(cell, min_lat, min_lng, max_lat, max_lng):
+        for item_id, (lat, lng) in list(cell.items()):
+            if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                yield item_id, lat, lng
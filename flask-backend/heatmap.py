@@ -0,0 +1,254 @@
+import io
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from marker_clusters import to_mercator, from_mercator
+
+# Colour ramp from sparse to dense: (intensity, r, g, b, alpha)
+HEATMAP_RAMP = np.array([
+    (0.00, 0, 0, 255, 0),
+    (0.25, 0, 160, 255, 110),
+    (0.50, 0, 220, 90, 160),
+    (0.75, 255, 220, 0, 200),
+    (1.00, 230, 20, 20, 230)
+], dtype=np.float64)
+
+
+def epoch_seconds(value):
+    """Epoch seconds of an ISO timestamp (naive values are local time), or None"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def tile_in_range(z, x, y):
+    """True if z/x/y names a tile of the standard slippy-map pyramid"""
+    return 0 <= z <= 22 and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def box_blur(grid, radius):
+    """Approximate Gaussian blur: three separable box blurs of the given radius"""
+    size = 2 * radius + 1
+    for _ in range(3):
+        for axis in (0, 1):
+            padded = np.pad(grid, [(radius + 1, radius) if a == axis else (0, 0) for a in (0, 1)])
+            sums = np.cumsum(padded, axis=axis)
+            if axis == 0:
+                grid = (sums[size:] - sums[:-size]) / size
+            else:
+                grid = (sums[:, size:] - sums[:, :-size]) / size
+    return grid
+
+
+class HeatmapTiles:
+    """Report density heatmap served as slippy-map tiles, with per-tile caching
+
+    Report locations are kept as NumPy arrays of Web Mercator coordinates,
+    urgency codes and creation times. A tile is a 2D histogram of the
+    points inside it (plus a margin so the blur is seamless across tile
+    edges), blurred and coloured into a PNG, or returned as a raw count
+    grid. Rendered tiles are cached per filter set; a new report only evicts
+    the cached tiles that its blurred footprint overlaps at each zoom.
+    """
+
+    def __init__(self, tile_size=256, radius_px=None, saturation=None, max_tiles=None, urgency_levels=()):
+        self.tile_size = tile_size
+        self.radius_px = radius_px or int(os.getenv('HEATMAP_RADIUS_PX', 12))
+        self.saturation = saturation or float(os.getenv('HEATMAP_SATURATION', 500))
+        self.max_tiles = max_tiles or int(os.getenv('HEATMAP_CACHE_TILES', 2048))
+        self.urgency_levels = tuple(urgency_levels)
+
+        self._x = np.empty(0)
+        self._y = np.empty(0)
+        self._urgency = np.empty(0, dtype=np.int8)
+        self._created = np.empty(0)
+        self._pending = []           # points added since the arrays were last concatenated
+        self._tiles = OrderedDict()  # (z, x, y, format, bins, filters) -> (body, etag)
+        self._lock = threading.RLock()
+        self._journal = None
+        self._version = 0            # bumped on every change so renders racing one are not cached
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self.built_at = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._x) + len(self._pending)
+
+    def add(self, lat, lng, urgency_level=None, created_at=None):
+        """Count a new report and evict the cached tiles it shows up in"""
+        point = self._point(lat, lng, urgency_level, created_at)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(point)
+            self._pending.append(point)
+            self._version += 1
+            self._evict_touched(point)
+
+    def begin_rebuild(self):
+        """Start recording new points so a reload from an older snapshot does not lose them"""
+        with self._lock:
+            self._journal = []
+
+    def load(self, points):
+        """Replace all points with (lat, lng, urgency_level, created_at epoch seconds) tuples"""
+        rows = [self._point(*point) for point in points]
+        with self._lock:
+            journal, self._journal = self._journal or [], None
+            self._set_arrays(rows + journal)
+            self._pending = []
+            self._tiles.clear()
+            self._version += 1
+            self.built_at = time.time()
+
+    def png(self, z, x, y, since=None, until=None, urgency_levels=None):
+        """(PNG bytes, etag) of the blurred density in one 256px tile"""
+        return self._cached((z, x, y, 'png', None, since, until, urgency_levels), self._render_png)
+
+    def grid(self, z, x, y, bins=64, since=None, until=None, urgency_levels=None):
+        """(JSON bytes, etag) of the raw report counts in one tile as a bins x bins grid"""
+        return self._cached((z, x, y, 'json', bins, since, until, urgency_levels), self._render_grid)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                'points': len(self._x) + len(self._pending),
+                'cached_tiles': len(self._tiles),
+                'built_at': self.built_at
+            }
+
+    # ------------------------------------------------------------ rendering
+
+    def _cached(self, key, render):
+        with self._lock:
+            cached = self._tiles.get(key)
+            if cached is not None:
+                self._tiles.move_to_end(key)
+                self._stats['hits'] += 1
+                return cached
+            self._stats['misses'] += 1
+            version = self._version
+
+        body = render(key)
+        entry = (body, hashlib.sha1(body).hexdigest())
+        with self._lock:
+            if version != self._version:
+                return entry
+            self._tiles[key] = entry
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        return entry
+
+    def _histogram(self, key, bins, margin_px=0):
+        """Counts for a tile widened by margin_px screen pixels, as a (rows, cols) array"""
+        z, x, y, _, _, since, until, urgency_levels = key
+        world = 2 ** z
+        margin = margin_px / (self.tile_size * world)
+        min_x, max_x = x / world - margin, (x + 1) / world + margin
+        min_y, max_y = y / world - margin, (y + 1) / world + margin
+
+        with self._lock:
+            self._flush_pending()
+            xs, ys, urgency, created = self._x, self._y, self._urgency, self._created
+
+        mask = (xs >= min_x) & (xs < max_x) & (ys >= min_y) & (ys < max_y)
+        if since is not None:
+            mask &= created >= since
+        if until is not None:
+            mask &= created < until
+        if urgency_levels:
+            codes = [self.urgency_levels.index(level) for level in urgency_levels if level in self.urgency_levels]
+            mask &= np.isin(urgency, codes)
+
+        # Same result as histogram2d over uniform bins, without its per-point searchsorted
+        rows = ((ys[mask] - min_y) * (bins / (max_y - min_y))).astype(np.int64).clip(0, bins - 1)
+        cols = ((xs[mask] - min_x) * (bins / (max_x - min_x))).astype(np.int64).clip(0, bins - 1)
+        return np.bincount(rows * bins + cols, minlength=bins * bins).reshape(bins, bins).astype(np.float64)
+
+    def _render_grid(self, key):
+        z, x, y, _, bins = key[:5]
+        counts = self._histogram(key, bins).astype(np.int64)
+        north, west = from_mercator(x / 2 ** z, y / 2 ** z)
+        south, east = from_mercator((x + 1) / 2 ** z, (y + 1) / 2 ** z)
+        rows, cols = np.nonzero(counts)
+        payload = {
+            'success': True,
+            'z': z, 'x': x, 'y': y,
+            'bins': bins,
+            'bounds': [round(west, 6), round(south, 6), round(east, 6), round(north, 6)],
+            'total': int(counts.sum()),
+            'max': int(counts.max()) if counts.size else 0,
+            # Sparse [row, col, count] triples; row 0 is the northern edge
+            'cells': [[int(r), int(c), int(counts[r, c])] for r, c in zip(rows, cols)]
+        }
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+    def _render_png(self, key):
+        margin = 3 * self.radius_px
+        counts = self._histogram(key, self.tile_size + 2 * margin, margin)
+        if counts.any():
+            # Blurred counts scaled back up to "reports within the radius"
+            density = box_blur(counts, self.radius_px)[margin:-margin, margin:-margin] * (2 * self.radius_px + 1) ** 2
+            # Log scale keeps both single reports and dense hotspots readable
+            intensity = np.clip(np.log1p(density) / np.log1p(self.saturation), 0.0, 1.0)
+            rgba = np.stack([np.interp(intensity, HEATMAP_RAMP[:, 0], HEATMAP_RAMP[:, channel])
+                             for channel in range(1, 5)], axis=-1)
+            rgba[intensity < 0.02] = 0
+        else:
+            rgba = np.zeros((self.tile_size, self.tile_size, 4))
+
+        buffer = io.BytesIO()
+        Image.fromarray(rgba.astype(np.uint8), 'RGBA').save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+
+    # ------------------------------------------------------------- points
+
+    def _point(self, lat, lng, urgency_level=None, created_at=None):
+        mx, my = to_mercator(lat, lng)
+        code = self.urgency_levels.index(urgency_level) if urgency_level in self.urgency_levels else -1
+        return mx, my, code, created_at if created_at is not None else time.time()
+
+    def _set_arrays(self, rows):
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        self._x = np.ascontiguousarray(columns[:, 0])
+        self._y = np.ascontiguousarray(columns[:, 1])
+        self._urgency = columns[:, 2].astype(np.int8)
+        self._created = np.ascontiguousarray(columns[:, 3])
+
+    def _flush_pending(self):
+        """Fold recently added points into the arrays; caller holds the lock"""
+        if not self._pending:
+            return
+        existing = np.column_stack((self._x, self._y, self._urgency.astype(np.float64), self._created))
+        self._set_arrays(np.concatenate((existing, np.array(self._pending, dtype=np.float64))))
+        self._pending = []
+
+    def _evict_touched(self, point):
+        """Drop cached tiles within the blur footprint of a point; caller holds the lock"""
+        mx, my, code, created = point
+        margin = 3 * self.radius_px
+        level = self.urgency_levels[code] if code >= 0 else None
+        for key in list(self._tiles):
+            z, x, y, _, _, since, until, urgency_levels = key
+            if since is not None and created < since or until is not None and created >= until:
+                continue
+            if urgency_levels and level not in urgency_levels:
+                continue
+            px, py = mx * 2 ** z * self.tile_size, my * 2 ** z * self.tile_size
+            if (x * self.tile_size - margin <= px < (x + 1) * self.tile_size + margin and
+                    y * self.tile_size - margin <= py < (y + 1) * self.tile_size + margin):
+                del self._tiles[key]
+                self._stats['evictions'] += 1
+
+
+# Global heatmap over all reports
+report_heatmap = HeatmapTiles(urgency_levels=('low', 'normal', 'high', 'emergency'))
@@ -0,0 +1,195 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+
+
+class IdempotencyStore:
+    """Bounded TTL store of idempotency keys shared by every worker through SQLite
+
+    A key moves from ``pending`` (request in flight) to ``done`` (response
+    stored). Retries with the same key and body get the stored response back;
+    a retry that arrives while the first attempt is still running gets a
+    conflict instead of running the request a second time.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=None, max_entries=None):
+        self.db_path = db_path or os.getenv('IDEMPOTENCY_DB', 'idempotency.db')
+        self.ttl_seconds = ttl_seconds or float(os.getenv('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+        self.max_entries = max_entries or int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 100000))
+        self.pending_timeout_seconds = float(os.getenv('IDEMPOTENCY_PENDING_TIMEOUT_SECONDS', 60))
+
+        self._local = threading.local()
+        self._inserts = 0
+
+    def begin(self, key, fingerprint):
+        """Claim a key; returns (state, stored) where state is new, replay, in_progress or mismatch"""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM idempotency_keys WHERE key = ? AND expires_at < ?', (key, now))
+            row = conn.execute(
+                'SELECT fingerprint, state, status_code, body, content_type, vary, created_at '
+                'FROM idempotency_keys WHERE key = ?',
+                (key,)
+            ).fetchone()
+
+            if row is None:
+                conn.execute(
+                    'INSERT INTO idempotency_keys (key, fingerprint, state, created_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (key, fingerprint, 'pending', now, now + self.ttl_seconds)
+                )
+                self._inserts += 1
+                if self._inserts % 100 == 0:
+                    self._evict(conn, now)
+                return 'new', None
+
+            stored_fingerprint, state, status_code, body, content_type, vary, created_at = row
+            if stored_fingerprint != fingerprint:
+                return 'mismatch', None
+            if state == 'done':
+                return 'replay', (status_code, body, content_type, vary)
+            if now - created_at > self.pending_timeout_seconds:
+                # The original attempt died without finishing; let this one take over
+                conn.execute('UPDATE idempotency_keys SET created_at = ? WHERE key = ?', (now, key))
+                return 'new', None
+            return 'in_progress', None
+
+    def complete(self, key, status_code, body, content_type=None, vary=None):
+        """Store the response for a claimed key, with the headers that describe its body"""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'UPDATE idempotency_keys SET state = ?, status_code = ?, body = ?, content_type = ?, vary = ? '
+                'WHERE key = ?',
+                ('done', status_code, body, content_type, vary, key)
+            )
+
+    def release(self, key):
+        """Forget a claimed key so a retry can run the request again"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM idempotency_keys WHERE key = ?', (key,))
+
+    def remember(self, key):
+        """Record that a side effect identified by key has happened"""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, state, created_at, expires_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, '', 'done', now, now + self.ttl_seconds)
+            )
+
+    def seen(self, key):
+        """True if remember(key) was called within the TTL"""
+        row = self._connection().execute(
+            'SELECT 1 FROM idempotency_keys WHERE key = ? AND expires_at >= ?', (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def _evict(self, conn, now):
+        """Drop expired keys, then the oldest ones beyond max_entries"""
+        conn.execute('DELETE FROM idempotency_keys WHERE expires_at < ?', (now,))
+        count = conn.execute('SELECT COUNT(*) FROM idempotency_keys').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM idempotency_keys WHERE key IN '
+                '(SELECT key FROM idempotency_keys ORDER BY created_at LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def _connection(self):
+        """One connection per thread and process; SQLite connections must not cross a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS idempotency_keys ('
+            'key TEXT PRIMARY KEY, fingerprint TEXT, state TEXT, status_code INTEGER, '
+            'body BLOB, created_at REAL, expires_at REAL, content_type TEXT, vary TEXT)'
+        )
+        # Databases created before responses kept their Content-Type and Vary
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(idempotency_keys)')}
+        for column in ('content_type', 'vary'):
+            if column not in columns:
+                try:
+                    conn.execute(f'ALTER TABLE idempotency_keys ADD COLUMN {column} TEXT')
+                except sqlite3.OperationalError:
+                    pass  # another worker added it first
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_created_at ON idempotency_keys(created_at)')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(scope):
+    """Replay the stored response for requests that repeat an Idempotency-Key header"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            header = request.headers.get('Idempotency-Key')
+            if not header:
+                return view(*args, **kwargs)
+
+            key = f"{scope}:{header}"
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            try:
+                state, stored = idempotency_store.begin(key, fingerprint)
+            except Exception as e:
+                # Never fail a submission because the key store is unavailable
+                print(f"Idempotency store error: {str(e)}")
+                return view(*args, **kwargs)
+
+            if state == 'replay':
+                # Replay the representation the first attempt negotiated (JSON or msgpack)
+                status_code, body, content_type, vary = stored
+                response = current_app.response_class(body, status=status_code,
+                                                      content_type=content_type or 'application/json')
+                if vary:
+                    response.headers['Vary'] = vary
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            if state == 'in_progress':
+                return jsonify({
+                    'success': False,
+                    'message': 'A request with this Idempotency-Key is still being processed'
+                }), 409
+
+            if state == 'mismatch':
+                return jsonify({
+                    'success': False,
+                    'message': 'Idempotency-Key was already used with a different request body'
+                }), 422
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                idempotency_store.release(key)
+                raise
+
+            # Server errors are not cached so the client can retry them
+            if response.status_code >= 500:
+                idempotency_store.release(key)
+            else:
+                idempotency_store.complete(key, response.status_code, response.get_data(),
+                                           response.headers.get('Content-Type'), response.headers.get('Vary'))
+            return response
+        return wrapper
+    return decorator
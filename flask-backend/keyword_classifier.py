@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import threading
+
+# Word characters, including combining marks so Devanagari and other Indic words are not split
+WORD_CHARS = '\\w\u0300-\u036f\u0900-\u0dff'
+
+
+def trie_pattern(terms):
+    """Regex source matching any of the terms, factored into a character trie
+
+    A flat alternation tries every term at every position; the trie form
+    only follows branches that share the text's next character, so matching
+    cost depends on term length rather than on how many terms there are.
+    Terms ending in '*' match any word continuation.
+    """
+    root = {}
+    for term in terms:
+        node = root
+        prefix = term.endswith('*')
+        for char in term.rstrip('*'):
+            node = node.setdefault(char, {})
+        node[''] = 'prefix' if prefix else node.get('', 'exact')
+
+    def build(node):
+        end = node.get('')
+        if end == 'prefix':
+            return f'[{WORD_CHARS}]*'
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        alternation = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+        return f'(?:{alternation})?' if end else alternation
+
+    return build(root)
+
+
+class KeywordClassifier:
+    """Weighted keyword rules for report triage, compiled into one regular expression
+
+    Rules are read from a JSON file (see ``analysis_rules.json``): each
+    rule gives a level, a language, a default weight and its terms, and
+    each level gives the score it needs plus the analysis fields it sets.
+    All terms of all languages are compiled into a single trie-shaped regex
+    with word boundaries, so a description is scanned once regardless of
+    how many terms exist, and "hurt" no longer matches inside "hurtle".
+    The file is reloaded when it changes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('ANALYSIS_RULES_FILE',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis_rules.json'))
+
+        self._pattern = None
+        self._exact = {}       # term -> [(level, language, weight)]
+        self._prefixes = {}    # prefix (without '*') -> [(level, language, weight)]
+        self._levels = []
+        self._default = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def load(self, rules):
+        """Compile a rules document (the parsed JSON file)"""
+        exact, prefixes = {}, {}
+        for rule in rules.get('rules', []):
+            for entry in rule['terms']:
+                term, weight = (entry, rule.get('weight', 1.0)) if isinstance(entry, str) else (entry['term'], entry['weight'])
+                term = ' '.join(term.casefold().split())
+                target = prefixes if term.endswith('*') else exact
+                target.setdefault(term.rstrip('*'), []).append((rule['level'], rule.get('language', 'en'), float(weight)))
+
+        terms = list(exact) + [prefix + '*' for prefix in prefixes]
+        pattern = re.compile(f'(?<![{WORD_CHARS}])(?:{trie_pattern(terms)})(?![{WORD_CHARS}])') if terms else None
+
+        with self._lock:
+            self._pattern, self._exact, self._prefixes = pattern, exact, prefixes
+            self._levels = rules.get('levels', [])
+            self._default = rules.get('default', {})
+
+    def classify(self, text):
+        """Score text against every level and pick the first level whose threshold is reached
+
+        Returns a dict with the chosen ``level``, the ``analysis`` fields it
+        sets, the ``scores`` per level, the ``matched_terms`` and the
+        ``languages`` they came from.
+        """
+        self._reload_if_changed()
+        with self._lock:
+            pattern, exact, prefixes = self._pattern, self._exact, self._prefixes
+            levels, default = self._levels, self._default
+
+        scores, matched, languages = {}, [], set()
+        normalized = ' '.join((text or '').casefold().split())
+        for match in (pattern.finditer(normalized) if pattern else ()):
+            word = match.group(0)
+            for level, language, weight in exact.get(word) or self._longest_prefix(prefixes, word):
+                scores[level] = scores.get(level, 0.0) + weight
+                matched.append({'term': word, 'level': level, 'language': language, 'weight': weight})
+                languages.add(language)
+
+        chosen = default
+        for level in levels:
+            if scores.get(level['name'], 0.0) >= level.get('threshold', 1.0):
+                chosen = level
+                break
+
+        return {
+            'level': chosen.get('name'),
+            'analysis': {key: value for key, value in chosen.items() if key not in ('name', 'threshold')},
+            'scores': {level: round(score, 3) for level, score in scores.items()},
+            'matched_terms': matched,
+            'languages': sorted(languages)
+        }
+
+    @staticmethod
+    def _longest_prefix(prefixes, word):
+        for end in range(len(word), 0, -1):
+            rules = prefixes.get(word[:end])
+            if rules:
+                return rules
+        return ()
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.load(json.load(f))
+            print(f"[KeywordClassifier] Loaded rules from {self.path}")
+        except Exception as e:
+            print(f"[KeywordClassifier] Failed to load {self.path}: {e}")
+        self._mtime = mtime
+
+
+# Global classifier used by /api/ai-analysis
+keyword_classifier = KeywordClassifier()
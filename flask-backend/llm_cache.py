@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def prompt_key(model, temperature, messages, **params):
+    """Content address of an LLM request: whitespace-normalized messages, model, temperature and params"""
+    normalized = [
+        {'role': message['role'], 'content': ' '.join(str(message['content']).split())}
+        for message in messages
+    ]
+    document = json.dumps({'model': model, 'temperature': temperature, 'messages': normalized, 'params': params},
+                          sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(document.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """Two-tier cache of LLM completions keyed by the hash of the request
+
+    The first tier is an in-process LRU, so a repeat in the same worker is
+    a dictionary lookup. The second is a SQLite table shared by every
+    worker, so a completion fetched by one worker saves the call in the
+    others. Entries expire after ``ttl_seconds``; the memory tier holds at
+    most ``max_memory_entries`` and the disk tier ``max_entries``, evicting
+    the least recently used. Concurrent misses for the same key wait for a
+    single call instead of each spending quota.
+    """
+
+    def __init__(self, db_path=None, ttl_seconds=None, max_entries=None, max_memory_entries=None):
+        self.db_path = db_path or os.getenv('LLM_CACHE_DB', 'llm_cache.db')
+        self.ttl_seconds = ttl_seconds or float(os.getenv('LLM_CACHE_TTL_SECONDS', 24 * 3600))
+        self.max_entries = max_entries or int(os.getenv('LLM_CACHE_MAX_ENTRIES', 50000))
+        self.max_memory_entries = max_memory_entries or int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', 1024))
+        self.enabled = os.getenv('LLM_CACHE_ENABLED', 'true').lower() != 'false'
+
+        self._memory = OrderedDict()   # key -> (value, expires_at)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+    def get(self, key, count_miss=True):
+        """Cached completion text for key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        try:
+            conn = self._connection()
+            row = conn.execute('SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?',
+                               (key, now)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            print(f"[LLMCache] Read failed: {e}")
+            row = None
+            with self._lock:
+                self._stats['errors'] += 1
+
+        with self._lock:
+            if row is None:
+                if count_miss:
+                    self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def set(self, key, value):
+        """Store a completion in both tiers"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._stats['stores'] += 1
+
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(
+                    'INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?)', (key, value, now, now, expires_at)
+                )
+                self._inserts += 1
+                if self._inserts % 100 == 0:
+                    self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"[LLMCache] Write failed: {e}")
+            with self._lock:
+                self._stats['errors'] += 1
+
+    def get_or_call(self, call, model, temperature, messages, **params):
+        """Completion text for a request, calling call() -> text only on a miss"""
+        if not self.enabled:
+            return call()
+
+        key = prompt_key(model, temperature, messages, **params)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock_for(key):
+            # Another thread may have fetched it while we waited
+            cached = self.get(key, count_miss=False)
+            if cached is not None:
+                return cached
+            value = call()
+            if value:
+                self.set(key, value)
+            return value
+
+    def clear(self):
+        """Drop every entry in this worker's memory tier and in the shared store"""
+        with self._lock:
+            self._memory.clear()
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM llm_cache')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        try:
+            stats['disk_entries'] = self._connection().execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        except sqlite3.Error:
+            stats['disk_entries'] = None
+
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else None
+        stats['ttl_seconds'] = self.ttl_seconds
+        stats['enabled'] = self.enabled
+        return stats
+
+    def _remember(self, key, value, expires_at):
+        """Put an entry in the memory tier; caller holds the lock"""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        conn.execute('DELETE FROM llm_cache WHERE expires_at < ?', (now,))
+        count = conn.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)',
+                (count - self.max_entries,)
+            )
+
+    def _lock_for(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                if len(self._key_locks) > self.max_memory_entries * 4:
+                    self._key_locks.clear()
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _connection(self):
+        """One connection per thread and process; SQLite connections must not cross a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            'key TEXT PRIMARY KEY, value TEXT, created_at REAL, accessed_at REAL, expires_at REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed_at ON llm_cache(accessed_at)')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+# Global cache for Groq enhancement responses
+llm_cache = LLMCache()
@@ -0,0 +1,215 @@
+import os
+import math
+import time
+import threading
+
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def to_mercator(lat, lng):
+    """Project lat/lng to Web Mercator world coordinates in [0, 1)"""
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    sin = math.sin(math.radians(lat))
+    x = (lng + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+
+def from_mercator(x, y):
+    """Inverse of to_mercator"""
+    lng = x * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+
+class ClusterIndex:
+    """Multi-zoom marker clusters over active reports, updated one report at a time
+
+    Every zoom level from 0 to ``max_zoom`` is a grid in Web Mercator space
+    whose cells are ``radius_px`` screen pixels wide at that zoom. A cell
+    only keeps aggregates (count, coordinate sums, counts per urgency), so
+    adding or removing a report touches one cell per zoom level. A viewport
+    query reads the cells overlapping the box at the requested zoom, which
+    is bounded by the number of clusters on screen rather than the number
+    of reports. Beyond ``max_zoom`` the individual reports are returned.
+    """
+
+    TILE_SIZE = 256
+
+    def __init__(self, max_zoom=None, radius_px=None):
+        self.max_zoom = max_zoom or int(os.getenv('CLUSTER_MAX_ZOOM', 16))
+        self.radius_px = radius_px or int(os.getenv('CLUSTER_RADIUS_PX', 64))
+
+        self._cells_per_world = [2 ** zoom * self.TILE_SIZE / self.radius_px for zoom in range(self.max_zoom + 1)]
+        self._levels = [{} for _ in range(self.max_zoom + 1)]  # zoom -> {(col, row): [count, sum_x, sum_y, {urgency: n}]}
+        self._leaves = {}    # (col, row) at max_zoom -> {id: True}
+        self._points = {}    # id -> ((col, row) at max_zoom, x, y, lat, lng, urgency)
+        self._lock = threading.RLock()
+        self._journal = None
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def add(self, report_id, lat, lng, urgency_level=None):
+        """Index a report, or move it if it is already indexed"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(('add', (report_id, lat, lng, urgency_level)))
+            self._add(report_id, lat, lng, urgency_level or 'normal')
+
+    def remove(self, report_id):
+        """Drop a report that is no longer active"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(('remove', (report_id,)))
+            self._remove(report_id)
+
+    def begin_rebuild(self):
+        """Start recording changes so a rebuild from an older snapshot does not lose them"""
+        with self._lock:
+            self._journal = []
+
+    def load(self, points):
+        """Replace the index with (id, lat, lng, urgency_level) tuples, then replay changes made meanwhile"""
+        fresh = ClusterIndex(self.max_zoom, self.radius_px)
+        for report_id, lat, lng, urgency_level in points:
+            fresh._add(report_id, lat, lng, urgency_level or 'normal')
+
+        with self._lock:
+            journal, self._journal = self._journal or [], None
+            self._levels, self._leaves, self._points = fresh._levels, fresh._leaves, fresh._points
+            for action, args in journal:
+                if action == 'add':
+                    self._add(args[0], args[1], args[2], args[3] or 'normal')
+                else:
+                    self._remove(*args)
+            self.built_at = time.time()
+
+    def clusters(self, zoom, bbox=None):
+        """Clusters and single reports at a zoom level inside (min_lat, min_lng, max_lat, max_lng)"""
+        zoom = max(0, int(zoom))
+        min_lat, min_lng, max_lat, max_lng = bbox or (-90, -180, 90, 180)
+        # Mercator y grows southwards
+        min_x, max_y = to_mercator(min_lat, min_lng)
+        max_x, min_y = to_mercator(max_lat, max_lng)
+
+        with self._lock:
+            features = []
+            if zoom > self.max_zoom:
+                for members in self._cells_in_box(self._leaves, self.max_zoom, min_x, min_y, max_x, max_y):
+                    for report_id in members:
+                        leaf, x, y, lat, lng, urgency = self._points[report_id]
+                        if min_x <= x <= max_x and min_y <= y <= max_y:
+                            features.append(self._point_feature(report_id, lat, lng, urgency))
+                return features
+
+            for key, (count, sum_x, sum_y, urgency) in self._cells_in_box(
+                    self._levels[zoom], zoom, min_x, min_y, max_x, max_y, with_keys=True):
+                if count == 1:
+                    report_id = self._single(sum_x, sum_y)
+                    if report_id is not None:
+                        leaf, x, y, lat, lng, urgency_level = self._points[report_id]
+                        features.append(self._point_feature(report_id, lat, lng, urgency_level))
+                        continue
+                lat, lng = from_mercator(sum_x / count, sum_y / count)
+                features.append({
+                    'id': f'{zoom}/{key[0]}/{key[1]}',
+                    'lat': round(lat, 6),
+                    'lng': round(lng, 6),
+                    'count': count,
+                    'urgency': {level: n for level, n in urgency.items() if n}
+                })
+            return features
+
+    def stats(self):
+        with self._lock:
+            return {
+                'indexed_reports': len(self._points),
+                'max_zoom': self.max_zoom,
+                'radius_px': self.radius_px,
+                'clusters_per_zoom': [len(level) for level in self._levels],
+                'built_at': self.built_at
+            }
+
+    def _key(self, zoom, x, y):
+        cells = self._cells_per_world[zoom]
+        return int(x * cells), int(y * cells)
+
+    def _add(self, report_id, lat, lng, urgency):
+        self._remove(report_id)
+        x, y = to_mercator(lat, lng)
+        for zoom, level in enumerate(self._levels):
+            cell = level.get(self._key(zoom, x, y))
+            if cell is None:
+                cell = level[self._key(zoom, x, y)] = [0, 0.0, 0.0, {}]
+            cell[0] += 1
+            cell[1] += x
+            cell[2] += y
+            cell[3][urgency] = cell[3].get(urgency, 0) + 1
+
+        leaf = self._key(self.max_zoom, x, y)
+        self._leaves.setdefault(leaf, {})[report_id] = True
+        self._points[report_id] = (leaf, x, y, lat, lng, urgency)
+
+    def _remove(self, report_id):
+        point = self._points.pop(report_id, None)
+        if point is None:
+            return
+        leaf, x, y, lat, lng, urgency = point
+        for zoom, level in enumerate(self._levels):
+            key = self._key(zoom, x, y)
+            cell = level[key]
+            cell[0] -= 1
+            if cell[0] == 0:
+                del level[key]
+                continue
+            cell[1] -= x
+            cell[2] -= y
+            cell[3][urgency] -= 1
+
+        members = self._leaves[leaf]
+        del members[report_id]
+        if not members:
+            del self._leaves[leaf]
+
+    def _single(self, x, y):
+        """The report a one-member cell holds: the indexed point nearest its centroid"""
+        members = self._leaves.get(self._key(self.max_zoom, x, y), ())
+        best = None
+        for report_id in members:
+            point = self._points[report_id]
+            distance = abs(point[1] - x) + abs(point[2] - y)
+            if best is None or distance < best[0]:
+                best = (distance, report_id)
+        return best[1] if best else None
+
+    def _cells_in_box(self, cells, zoom, min_x, min_y, max_x, max_y, with_keys=False):
+        first_col, first_row = self._key(zoom, min_x, min_y)
+        last_col, last_row = self._key(zoom, max_x, max_y)
+        span = (last_col - first_col + 1) * (last_row - first_row + 1)
+
+        if span > len(cells):
+            # Box covers more cells than are occupied: walk the occupied ones instead
+            keys = [key for key in cells if first_col <= key[0] <= last_col and first_row <= key[1] <= last_row]
+        else:
+            keys = [(col, row) for col in range(first_col, last_col + 1) for row in range(first_row, last_row + 1)
+                    if (col, row) in cells]
+
+        if with_keys:
+            return [(key, cells[key]) for key in keys]
+        return [cells[key] for key in keys]
+
+    @staticmethod
+    def _point_feature(report_id, lat, lng, urgency):
+        return {
+            'report_id': report_id,
+            'lat': lat,
+            'lng': lng,
+            'count': 1,
+            'urgency': {urgency: 1}
+        }
+
+
+# Global cluster index over active reports
+marker_clusters = ClusterIndex()
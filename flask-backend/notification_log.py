@@ -0,0 +1,109 @@
+import os
+import atexit
+import threading
+
+
+class NotificationLogWriter:
+    """Buffers notifications table rows and writes them as multi-row inserts
+
+    Rows are flushed when ``flush_rows`` are waiting or ``flush_interval_ms``
+    has passed, whichever comes first, and once more at interpreter exit.
+    A failed flush hands the rows to the spill callable (the fallback store)
+    so the backlog replayer can insert them later instead of dropping them.
+    """
+
+    def __init__(self, flush_rows=None, flush_interval_ms=None):
+        self.flush_rows = flush_rows or int(os.getenv('NOTIFICATION_LOG_FLUSH_ROWS', 50))
+        self.flush_interval = (flush_interval_ms or float(os.getenv('NOTIFICATION_LOG_FLUSH_INTERVAL_MS', 500))) / 1000
+
+        self.client = None
+        self.breaker = None
+        self.spill = None
+
+        self._rows = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started_pid = None
+        self._stats = {'buffered': 0, 'written': 0, 'flushes': 0, 'spilled': 0}
+
+    def configure(self, client, breaker=None, spill=None):
+        """Set the Supabase client, optional circuit breaker and spill callable(rows)"""
+        self.client = client
+        self.breaker = breaker
+        self.spill = spill
+
+    def add(self, row):
+        """Queue one notifications row"""
+        self._ensure_started()
+        with self._lock:
+            self._rows.append(row)
+            self._stats['buffered'] += 1
+            full = len(self._rows) >= self.flush_rows
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write every buffered row now"""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+
+            try:
+                insert = lambda: self.client.table('notifications').insert(rows).execute()
+                if self.breaker is not None:
+                    self.breaker.call(insert)
+                else:
+                    insert()
+            except Exception as e:
+                print(f"[NotificationLog] Flush of {len(rows)} rows failed, spilling: {e}")
+                self._spill(rows)
+                return 0
+
+            with self._lock:
+                self._stats['written'] += len(rows)
+                self._stats['flushes'] += 1
+            return len(rows)
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'pending': len(self._rows)}
+
+    def _spill(self, rows):
+        if self.spill is None:
+            print(f"[NotificationLog] No spill target; {len(rows)} rows lost")
+            return
+        try:
+            self.spill(rows)
+            with self._lock:
+                self._stats['spilled'] += len(rows)
+        except Exception as e:
+            print(f"[NotificationLog] Spill failed; {len(rows)} rows lost: {e}")
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            self._wakeup = threading.Event()
+            threading.Thread(target=self._flush_loop, name='notification-log', daemon=True).start()
+            atexit.register(self.flush)
+            self._started_pid = pid
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[NotificationLog] Flush loop error: {e}")
+
+
+# Global writer instance
+notification_log = NotificationLogWriter()
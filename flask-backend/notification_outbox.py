@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime
+
+
+class NotificationOutbox:
+    """Durable outbox of pending notification jobs drained by background workers
+
+    Each call to enqueue() writes one file holding every job for that
+    submission (bulk submissions are chunked), so the request only pays for
+    a single local write. Files are
+    named ``<next_attempt_ms>-<entry_id>.json`` which lets the sweeper find due
+    entries from a directory listing alone, and a worker claims an entry by
+    renaming it, which is atomic across gunicorn workers sharing the folder.
+    """
+
+    def __init__(self, outbox_dir=None, workers=None, max_attempts=None):
+        self.outbox_dir = outbox_dir or os.getenv('OUTBOX_DIR', 'notification_outbox')
+        self.dead_dir = os.path.join(self.outbox_dir, 'dead')
+        self.workers = workers or int(os.getenv('OUTBOX_WORKERS', 4))
+        self.max_attempts = max_attempts or int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+        self.retry_base_seconds = float(os.getenv('OUTBOX_RETRY_BASE_SECONDS', 5))
+        self.retry_max_seconds = float(os.getenv('OUTBOX_RETRY_MAX_SECONDS', 600))
+        self.poll_seconds = float(os.getenv('OUTBOX_POLL_SECONDS', 2))
+        self.claim_timeout_seconds = float(os.getenv('OUTBOX_CLAIM_TIMEOUT_SECONDS', 300))
+        self.entry_max_jobs = int(os.getenv('OUTBOX_ENTRY_MAX_JOBS', 100))
+
+        self.handlers = {}
+        self.batch_handlers = {}
+        self.result_logger = None
+        self.sent_registry = None
+
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._started_pid = None
+        self._stats = {'enqueued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'deduplicated': 0}
+
+    def register_handler(self, job_type, handler):
+        """Register the callable that delivers jobs of the given type"""
+        self.handlers[job_type] = handler
+
+    def register_batch_handler(self, job_type, handler):
+        """Register a callable(payloads) -> results that delivers many jobs of a type at once"""
+        self.batch_handlers[job_type] = handler
+
+    def set_result_logger(self, logger):
+        """Register a callable(job, result) invoked after every delivery attempt"""
+        self.result_logger = logger
+
+    def set_sent_registry(self, registry):
+        """Register a store with seen(key)/remember(key) used to never deliver a job twice"""
+        self.sent_registry = registry
+
+    def make_job(self, report_id, job_type, notification_type, recipient, payload, log_to_db=False):
+        """Build a pending job record"""
+        return {
+            'job_id': f"{report_id}:{job_type}:{recipient}",
+            'report_id': report_id,
+            'type': job_type,
+            'notification_type': notification_type,
+            'recipient': recipient,
+            'payload': payload,
+            'log_to_db': log_to_db,
+            'status': 'pending',
+            'attempts': 0,
+            'last_error': None
+        }
+
+    def enqueue(self, jobs):
+        """Persist a list of jobs as outbox entries and wake the workers
+
+        Large lists are split into entries of at most OUTBOX_ENTRY_MAX_JOBS
+        jobs so several workers can drain a bulk submission in parallel.
+        Returns the list of entry ids written.
+        """
+        if not jobs:
+            return []
+
+        self._ensure_started()
+
+        entry_ids = []
+        for start in range(0, len(jobs), self.entry_max_jobs):
+            entry = {
+                'entry_id': str(uuid.uuid4()),
+                'created_at': datetime.now().isoformat(),
+                'jobs': jobs[start:start + self.entry_max_jobs]
+            }
+            filename = self._write_entry(entry, time.time())
+            entry_ids.append(entry['entry_id'])
+            self._push(filename)
+
+        with self._lock:
+            self._stats['enqueued'] += len(jobs)
+        return entry_ids
+
+    def stats(self):
+        """Return delivery counters for this process plus the current backlog size"""
+        with self._lock:
+            stats = dict(self._stats)
+        try:
+            stats['pending_entries'] = sum(1 for name in os.listdir(self.outbox_dir) if name.endswith('.json'))
+        except FileNotFoundError:
+            stats['pending_entries'] = 0
+        stats['workers'] = self.workers
+        return stats
+
+    def _ensure_started(self):
+        """Start worker threads once per process (threads do not survive a fork)"""
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+
+        with self._lock:
+            if self._started_pid == pid:
+                return
+
+            os.makedirs(self.dead_dir, exist_ok=True)
+            self._queue = queue.Queue()
+            self._queued = set()
+
+            for i in range(self.workers):
+                threading.Thread(target=self._worker_loop, name=f'outbox-worker-{i}', daemon=True).start()
+            threading.Thread(target=self._sweep_loop, name='outbox-sweeper', daemon=True).start()
+
+            self._started_pid = pid
+            print(f"[Outbox] Started {self.workers} workers on {self.outbox_dir}")
+
+    def _push(self, filename):
+        with self._lock:
+            if filename in self._queued:
+                return
+            self._queued.add(filename)
+        self._queue.put(filename)
+
+    def _write_entry(self, entry, next_attempt_at):
+        """Atomically write an entry file and return its name"""
+        filename = f"{int(next_attempt_at * 1000):015d}-{entry['entry_id']}.json"
+        path = os.path.join(self.outbox_dir, filename)
+        tmp_path = f"{path}.tmp"
+
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return filename
+
+    def _sweep_loop(self):
+        """Periodically queue due entries and recover claims abandoned by dead workers"""
+        while True:
+            try:
+                now = time.time()
+                for name in sorted(os.listdir(self.outbox_dir)):
+                    path = os.path.join(self.outbox_dir, name)
+
+                    if name.endswith('.json'):
+                        due_ms = int(name.split('-', 1)[0])
+                        if due_ms <= now * 1000:
+                            self._push(name)
+                    elif '.claimed-' in name:
+                        try:
+                            if now - os.path.getmtime(path) > self.claim_timeout_seconds:
+                                os.replace(path, os.path.join(self.outbox_dir, name.split('.claimed-', 1)[0]))
+                                print(f"[Outbox] Recovered stale claim {name}")
+                        except FileNotFoundError:
+                            pass
+            except Exception as e:
+                print(f"[Outbox] Sweep error: {e}")
+
+            time.sleep(self.poll_seconds)
+
+    def _worker_loop(self):
+        while True:
+            filename = self._queue.get()
+            with self._lock:
+                self._queued.discard(filename)
+
+            try:
+                self._process(filename)
+            except Exception as e:
+                print(f"[Outbox] Failed to process {filename}: {e}")
+
+    def _process(self, filename):
+        path = os.path.join(self.outbox_dir, filename)
+        claimed_path = f"{path}.claimed-{os.getpid()}-{threading.get_ident()}"
+
+        # Claim the entry; losing the race to another worker is not an error
+        try:
+            os.rename(path, claimed_path)
+        except (FileNotFoundError, PermissionError):
+            return
+        # rename keeps the old mtime; refresh it so the sweeper sees a live claim
+        os.utime(claimed_path)
+
+        with open(claimed_path, 'r') as f:
+            entry = json.load(f)
+
+        # Group pending jobs by type so batch handlers can share one connection
+        pending_by_type = {}
+        for job in entry['jobs']:
+            if job['status'] != 'pending':
+                continue
+            # A worker that crashed after sending but before saving the entry
+            # leaves the job pending; the registry stops it going out twice
+            if self._already_sent(job):
+                job['status'] = 'sent'
+                with self._lock:
+                    self._stats['deduplicated'] += 1
+                continue
+            pending_by_type.setdefault(job['type'], []).append(job)
+
+        for job_type, jobs in pending_by_type.items():
+            batch_handler = self.batch_handlers.get(job_type)
+            if batch_handler and len(jobs) > 1:
+                self._attempt_batch(batch_handler, jobs)
+            else:
+                for job in jobs:
+                    self._attempt(job)
+
+        pending = [job for job in entry['jobs'] if job['status'] == 'pending']
+        if pending:
+            attempts = max(job['attempts'] for job in pending)
+            delay = min(self.retry_base_seconds * (2 ** (attempts - 1)), self.retry_max_seconds)
+            self._write_entry(entry, time.time() + delay)
+            with self._lock:
+                self._stats['retried'] += len(pending)
+        elif any(job['status'] == 'failed' for job in entry['jobs']):
+            # Keep permanently failed entries around for inspection
+            with open(os.path.join(self.dead_dir, f"{entry['entry_id']}.json"), 'w') as f:
+                json.dump(entry, f, indent=2)
+
+        os.remove(claimed_path)
+
+    def _already_sent(self, job):
+        if self.sent_registry is None:
+            return False
+        try:
+            return self.sent_registry.seen(f"send:{job['job_id']}")
+        except Exception as e:
+            print(f"[Outbox] Sent registry lookup failed: {e}")
+            return False
+
+    def _attempt(self, job):
+        """Run one delivery attempt and update the job in place"""
+        handler = self.handlers.get(job['type'])
+
+        if handler is None:
+            result = {'success': False, 'error': f"No handler registered for {job['type']}"}
+        else:
+            try:
+                result = handler(**job['payload'])
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+
+        self._record_attempt(job, result)
+
+    def _attempt_batch(self, batch_handler, jobs):
+        """Deliver several jobs of one type with a single handler call"""
+        try:
+            results = batch_handler([job['payload'] for job in jobs])
+        except Exception as e:
+            results = [{'success': False, 'error': str(e)} for _ in jobs]
+
+        for job, result in zip(jobs, results):
+            self._record_attempt(job, result)
+
+    def _record_attempt(self, job, result):
+        """Apply the outcome of a delivery attempt to the job"""
+        job['attempts'] += 1
+
+        if result.get('success'):
+            job['status'] = 'sent'
+            job['last_error'] = None
+            with self._lock:
+                self._stats['sent'] += 1
+            if self.sent_registry is not None:
+                try:
+                    self.sent_registry.remember(f"send:{job['job_id']}")
+                except Exception as e:
+                    print(f"[Outbox] Sent registry update failed: {e}")
+        else:
+            job['last_error'] = result.get('error')
+            if job['attempts'] >= self.max_attempts:
+                job['status'] = 'failed'
+                with self._lock:
+                    self._stats['failed'] += 1
+                print(f"[Outbox] Giving up on {job['job_id']} after {job['attempts']} attempts: {job['last_error']}")
+
+        # Only the final outcome is recorded; intermediate retries are not
+        if job['status'] != 'pending' and self.result_logger:
+            try:
+                self.result_logger(job, result)
+            except Exception as e:
+                print(f"[Outbox] Result logging failed for {job['job_id']}: {e}")
+
+
+# Global outbox instance
+notification_outbox = NotificationOutbox()
@@ -0,0 +1,166 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TimeoutSession(requests.Session):
+    """requests Session that applies a default (connect, read) timeout to every call"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class ClientProxy:
+    """Stands in for a registry client, resolving it in the current process on every use
+
+    Module globals built at import time end up in the gunicorn master when
+    the app is preloaded; a proxy lets them keep their name while each
+    worker talks through its own client and connections.
+    """
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        return f"<ClientProxy {self._name}>"
+
+
+class ClientRegistry:
+    """Outbound API clients (Groq, Twilio, Supabase, plain HTTP) built once per worker
+
+    Each client is created on first use from its registered factory and
+    reused afterwards, so requests share keep-alive connection pools instead
+    of paying for client construction and a TLS handshake every time. Pools
+    hold at most ``pool_maxsize`` connections per host, and every client
+    gets explicit connect and read timeouts. Sockets must not be shared
+    across a fork, so clients are dropped in a forked child (gunicorn
+    ``--preload``) and rebuilt there on first use.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, pool_maxsize=None, pool_hosts=None):
+        self.connect_timeout = connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+        self.read_timeout = read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', 30))
+        self.pool_maxsize = pool_maxsize or int(os.getenv('HTTP_POOL_MAXSIZE', 10))
+        self.pool_hosts = pool_hosts or int(os.getenv('HTTP_POOL_HOSTS', 10))
+
+        self._factories = {}
+        self._clients = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._stats = {'built': {}, 'forks': 0}
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple in the form requests expects"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def register(self, name, factory):
+        """Register factory(registry) -> client under name"""
+        self._factories[name] = factory
+
+    def get(self, name):
+        """The client registered under name, built on first use in this process"""
+        if self._pid != os.getpid():
+            # Platforms without register_at_fork
+            self._after_fork()
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                if name not in self._factories:
+                    raise KeyError(f"No outbound client registered as '{name}'")
+                client = self._factories[name](self)
+                self._clients[name] = client
+                self._stats['built'][name] = self._stats['built'].get(name, 0) + 1
+                print(f"[OutboundClients] Built {name} client in process {os.getpid()}")
+            return client
+
+    def proxy(self, name):
+        return ClientProxy(self, name)
+
+    def session(self):
+        """Shared requests Session for plain HTTP APIs"""
+        return self.get('http')
+
+    def adapter(self):
+        """HTTPAdapter with this registry's pool limits; retries are left to callers"""
+        return HTTPAdapter(pool_connections=self.pool_hosts, pool_maxsize=self.pool_maxsize, max_retries=0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': sorted(self._clients),
+                'built': dict(self._stats['built']),
+                'forks': self._stats['forks'],
+                'connect_timeout': self.connect_timeout,
+                'read_timeout': self.read_timeout,
+                'pool_maxsize': self.pool_maxsize
+            }
+
+    def _after_fork(self):
+        # The parent's sockets stay with the parent; the child starts with no clients
+        # and a fresh lock, in case the fork happened while another thread held it
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+        self._stats = {'built': {}, 'forks': self._stats['forks'] + 1}
+
+
+def build_http_session(registry):
+    session = TimeoutSession(registry.timeout)
+    session.mount('https://', registry.adapter())
+    session.mount('http://', registry.adapter())
+    return session
+
+
+def build_groq(registry):
+    import httpx
+    from groq import Groq
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(registry.read_timeout, connect=registry.connect_timeout),
+        limits=httpx.Limits(max_connections=registry.pool_maxsize, max_keepalive_connections=registry.pool_maxsize)
+    )
+    return Groq(api_key=os.getenv('GROQ_API_KEY'), http_client=http_client)
+
+
+def build_twilio(registry):
+    from twilio.rest import Client as TwilioClient
+    from twilio.http.http_client import TwilioHttpClient
+    http_client = TwilioHttpClient(pool_connections=True, timeout=registry.read_timeout)
+    # TwilioHttpClient only validates a single number; requests itself takes (connect, read)
+    http_client.timeout = registry.timeout
+    http_client.session.mount('https://', registry.adapter())
+    return TwilioClient(os.getenv('TWILIO_ACCOUNT_SID'), os.getenv('TWILIO_AUTH_TOKEN'), http_client=http_client)
+
+
+def build_supabase(registry):
+    import httpx
+    from supabase import create_client
+    from supabase.lib.client_options import ClientOptions
+    options = ClientOptions(postgrest_client_timeout=httpx.Timeout(registry.read_timeout,
+                                                                   connect=registry.connect_timeout))
+    return create_client(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_API_KEY'), options=options)
+
+
+# Global outbound client registry
+outbound_clients = ClientRegistry()
+outbound_clients.register('http', build_http_session)
+outbound_clients.register('groq', build_groq)
+outbound_clients.register('twilio', build_twilio)
+outbound_clients.register('supabase', build_supabase)
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+from report_store import FileLock
+
+REPORT_CREATED = 'report.created'
+REPORT_STATUS_CHANGED = 'report.status_changed'
+
+# Report fields that go out on the public event stream (no contact details)
+STREAM_FIELDS = ('id', 'status', 'urgency_level', 'animal_type', 'situation_type',
+                 'location', 'description', 'coordinates', 'lat', 'lng', 'duplicate_of', 'created_at')
+
+
+def parse_event_id(value):
+    """Turn a Last-Event-ID header back into a comparable (generation, offset), or None"""
+    try:
+        generation, offset = value.split('-')
+        return int(generation), int(offset)
+    except (AttributeError, ValueError):
+        return None
+
+
+class ReportEvents:
+    """Publish/subscribe hook for report lifecycle changes, shared across workers
+
+    save_report and status updates publish here. In-process subscribers
+    (caches and in-memory indexes) are called synchronously, and a failing
+    handler never breaks the request or the other handlers.
+
+    Every event is also appended to a shared log under ``log_dir`` so that
+    stream listeners in any worker see it. A tailer thread per process polls
+    the log every ``poll_interval`` seconds and keeps the newest events in a
+    ring buffer, which lets reconnecting clients resume from their
+    Last-Event-ID. Event ids are ``<log generation>-<byte offset>``.
+    Handlers registered with ``subscribe_shared`` are called from the
+    tailer for every logged event, whichever worker published it.
+    """
+
+    def __init__(self, log_dir=None, buffer_size=None, poll_interval=None, log_max_bytes=None):
+        self.log_dir = log_dir or os.getenv('REPORT_EVENTS_DIR', 'report_events')
+        self.buffer_size = buffer_size or int(os.getenv('REPORT_EVENTS_BUFFER_SIZE', 1000))
+        self.poll_interval = poll_interval or float(os.getenv('REPORT_EVENTS_POLL_SECONDS', 0.25))
+        self.log_max_bytes = log_max_bytes or int(os.getenv('REPORT_EVENTS_LOG_MAX_BYTES', 16 * 1024 * 1024))
+
+        self._handlers = {}
+        self._shared_handlers = {}
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._file_lock = None
+
+        self._buffer = deque(maxlen=self.buffer_size)  # (event_id, event_type, payload)
+        self._changed = threading.Condition()
+        self._tail = None
+        self._tailer_pid = None
+
+    def subscribe(self, event_type, handler):
+        """Call handler(report) whenever event_type is published in this process"""
+        with self._lock:
+            self._handlers.setdefault(event_type, []).append(handler)
+
+    def subscribe_shared(self, event_type, handler):
+        """Call handler(payload) for every event_type in the shared log, from any worker
+
+        The payload only carries STREAM_FIELDS. Events are delivered in log
+        order, after a short delay (see ``refresh``), and this process's own
+        events come back too, so handlers must be idempotent.
+        """
+        with self._lock:
+            self._shared_handlers.setdefault(event_type, []).append(handler)
+
+    def refresh(self):
+        """Read the shared log up to its end now instead of waiting for the next poll"""
+        self._ensure_tailing()
+        self._read_new()
+
+    def publish(self, event_type, report):
+        """Notify every subscriber of event_type and append the event to the shared log"""
+        with self._lock:
+            handlers = list(self._handlers.get(event_type, ()))
+
+        for handler in handlers:
+            try:
+                handler(report)
+            except Exception as e:
+                print(f"[ReportEvents] {event_type} handler {getattr(handler, '__name__', handler)} failed: {e}")
+
+        try:
+            self._append(event_type, {field: report.get(field) for field in STREAM_FIELDS if field in report})
+        except Exception as e:
+            print(f"[ReportEvents] Failed to log {event_type} for {report.get('id')}: {e}")
+
+    def listen(self, last_event_id=None, keepalive_seconds=15):
+        """Yield (event_id, event_type, payload) as events arrive, or None every keepalive_seconds
+
+        Events after last_event_id are replayed from the ring buffer first.
+        If the buffer no longer reaches back that far a single
+        ('reset', 'reset', {}) event is yielded so the client can refetch.
+        """
+        self._ensure_tailing()
+
+        with self._changed:
+            buffered = list(self._buffer)
+            # Just before the next position the tailer will read
+            cursor = buffered[-1][0] if buffered else (self._tail[0], self._tail[1] - 1)
+
+        if last_event_id is not None:
+            if buffered and last_event_id < buffered[0][0]:
+                yield 'reset', 'reset', {}
+            for event in buffered:
+                if event[0] > last_event_id:
+                    yield event
+
+        while True:
+            with self._changed:
+                fresh = self._events_after(cursor)
+                if not fresh:
+                    self._changed.wait(keepalive_seconds)
+                    fresh = self._events_after(cursor)
+            if not fresh:
+                yield None
+                continue
+            cursor = fresh[-1][0]
+            yield from fresh
+
+    def _events_after(self, cursor):
+        """Buffered events newer than cursor, oldest first; caller holds the condition"""
+        fresh = []
+        for event in reversed(self._buffer):
+            if cursor is not None and event[0] <= cursor:
+                break
+            fresh.append(event)
+        fresh.reverse()
+        return fresh
+
+    # ------------------------------------------------------------------ log
+
+    def _path(self, generation):
+        return os.path.join(self.log_dir, f'events-{generation:06d}.jsonl')
+
+    def _latest_generation(self):
+        generations = [int(name[7:13]) for name in os.listdir(self.log_dir)
+                       if name.startswith('events-') and name.endswith('.jsonl')]
+        return max(generations, default=1)
+
+    def _append(self, event_type, payload):
+        os.makedirs(self.log_dir, exist_ok=True)
+        if self._file_lock is None:
+            self._file_lock = FileLock(os.path.join(self.log_dir, 'events.lock'))
+
+        line = (json.dumps({'type': event_type, 'report': payload}, separators=(',', ':'), default=str) + '\n')
+        with self._file_lock:
+            generation = self._latest_generation()
+            path = self._path(generation)
+            if os.path.exists(path) and os.path.getsize(path) > self.log_max_bytes:
+                # Start a new generation and drop the one before the previous
+                generation += 1
+                path = self._path(generation)
+                try:
+                    os.remove(self._path(generation - 2))
+                except FileNotFoundError:
+                    pass
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def _ensure_tailing(self):
+        pid = os.getpid()
+        if self._tailer_pid == pid:
+            return
+
+        with self._lock:
+            if self._tailer_pid == pid:
+                return
+            os.makedirs(self.log_dir, exist_ok=True)
+            generation = self._latest_generation()
+            # Start a little behind the end so recent events can be resumed
+            try:
+                size = os.path.getsize(self._path(generation))
+            except FileNotFoundError:
+                size = 0
+            start = max(0, size - 256 * self.buffer_size)
+            self._changed = threading.Condition()
+            self._buffer = deque(maxlen=self.buffer_size)
+            self._tail = (generation, start)
+            # Events from before this process started tailing are not handed to shared handlers
+            with self._read_lock:
+                self._read_log(skip_partial=start > 0)
+            threading.Thread(target=self._tail_loop, name='report-events', daemon=True).start()
+            self._tailer_pid = pid
+
+    def _tail_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._read_new()
+            except Exception as e:
+                print(f"[ReportEvents] Tail error: {e}")
+
+    def _read_new(self, skip_partial=False):
+        """Read events appended since the last look into the ring buffer and hand them to shared handlers"""
+        with self._read_lock:
+            events = self._read_log(skip_partial)
+
+        with self._lock:
+            shared = {event_type: list(handlers) for event_type, handlers in self._shared_handlers.items()}
+        for event_id, event_type, payload in events:
+            for handler in shared.get(event_type, ()):
+                try:
+                    handler(payload)
+                except Exception as e:
+                    print(f"[ReportEvents] Shared {event_type} handler {getattr(handler, '__name__', handler)} failed: {e}")
+
+    def _read_log(self, skip_partial=False):
+        generation, offset = self._tail
+        events = []
+        while True:
+            try:
+                with open(self._path(generation), 'rb') as f:
+                    f.seek(offset)
+                    if skip_partial:
+                        offset += len(f.readline())
+                        skip_partial = False
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break  # writer is mid-line; read it next time
+                        record = json.loads(line)
+                        events.append(((generation, offset), record['type'], record['report']))
+                        offset += len(line)
+            except FileNotFoundError:
+                pass
+
+            if not os.path.exists(self._path(generation + 1)):
+                break
+            generation, offset = generation + 1, 0
+
+        with self._changed:
+            self._tail = (generation, offset)
+            if events:
+                self._buffer.extend(events)
+                self._changed.notify_all()
+        return events
+
+
+# Global event hub
+report_events = ReportEvents()
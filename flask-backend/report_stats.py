@@ -0,0 +1,234 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from geo import geohash, report_point
+
+DIMENSIONS = ('urgency_level', 'animal_type', 'situation_type', 'status')
+
+# Counter tables and their keys: per hour, and all-time for queries without a time window
+ROLLUP_TABLES = {
+    'rollups': ('hour', 'geohash') + DIMENSIONS,
+    'rollup_totals': ('geohash',) + DIMENSIONS
+}
+
+
+def hour_bucket(created_at):
+    """UTC hour bucket ('YYYY-MM-DDTHH') of an ISO timestamp; naive values are local time"""
+    try:
+        moment = datetime.fromisoformat(created_at) if created_at else datetime.now()
+    except (TypeError, ValueError):
+        moment = datetime.now()
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H')
+
+
+class ReportStats:
+    """Rollup counters of reports by urgency, animal, situation, status, hour and geohash
+
+    Counters live in SQLite so every worker reads and updates the same
+    numbers. Alongside the counters a small table remembers which cell each
+    report was counted in, which makes updates idempotent and lets a status
+    change move a report from one cell to another. Queries over a time
+    window range-scan the hourly counters keyed by hour first; queries
+    without one read the all-time counters, which do not grow with time.
+    """
+
+    def __init__(self, db_path=None, geohash_precision=None):
+        self.db_path = db_path or os.getenv('REPORT_STATS_DB', 'report_stats.db')
+        self.geohash_precision = geohash_precision or int(os.getenv('STATS_GEOHASH_PRECISION', 4))
+
+        self._local = threading.local()
+        self._rebuild = {'running': False, 'started_at': None, 'finished_at': None, 'reports': 0, 'error': None}
+        self._rebuild_lock = threading.Lock()
+
+    def dimensions(self, report):
+        """The rollup cell a report is counted in"""
+        point = report_point(report)
+        return (
+            hour_bucket(report.get('created_at')),
+            geohash(point[0], point[1], self.geohash_precision) if point else '',
+            report.get('urgency_level') or 'normal',
+            report.get('animal_type') or '',
+            report.get('situation_type') or '',
+            report.get('status') or 'active'
+        )
+
+    def record(self, report):
+        """Count a new report, or move an existing one to the cell matching its current state"""
+        dims = self.dimensions(report)
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._apply(conn, '', report['id'], dims)
+            # A rebuild in progress must not miss, or later overwrite, changes made meanwhile
+            if self._staging_exists(conn):
+                self._apply(conn, '_staging', report['id'], dims)
+                conn.execute('INSERT OR IGNORE INTO touched_staging (id) VALUES (?)', (report['id'],))
+
+    def query(self, group_by=(), filters=None, since=None, until=None, geohash_prefix=None, geohash_precision=None):
+        """Sum counters matching the filters, grouped by the given dimensions"""
+        columns = {
+            'urgency_level': 'urgency_level',
+            'animal_type': 'animal_type',
+            'situation_type': 'situation_type',
+            'status': 'status',
+            'hour': 'hour',
+            'day': 'substr(hour, 1, 10)',
+            'geohash': f'substr(geohash, 1, {int(geohash_precision or self.geohash_precision)})'
+        }
+        unknown = [name for name in group_by if name not in columns]
+        if unknown:
+            raise ValueError(f'cannot group by: {", ".join(unknown)}')
+
+        where, params = [], []
+        for name, values in (filters or {}).items():
+            if name not in DIMENSIONS:
+                raise ValueError(f'cannot filter by: {name}')
+            where.append(f'{name} IN ({", ".join("?" for _ in values)})')
+            params.extend(value or '' for value in values)
+        if since:
+            where.append('hour >= ?')
+            params.append(since)
+        if until:
+            where.append('hour < ?')
+            params.append(until)
+        if geohash_prefix:
+            where.append('geohash >= ? AND geohash < ?')
+            params.extend([geohash_prefix, geohash_prefix + '~'])
+
+        timed = since or until or 'hour' in group_by or 'day' in group_by
+        selected = [f'{columns[name]} AS {name}' for name in group_by]
+        sql = f'SELECT {", ".join(selected + ["SUM(count)"])} FROM {"rollups" if timed else "rollup_totals"}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if group_by:
+            sql += f' GROUP BY {", ".join(columns[name] for name in group_by)} ORDER BY SUM(count) DESC'
+
+        groups = []
+        for row in self._connection().execute(sql, params):
+            if row[-1] is None:
+                continue
+            group = {name: (value if value != '' else None) for name, value in zip(group_by, row)}
+            group['count'] = row[-1]
+            groups.append(group)
+        return groups
+
+    def rebuild(self, reports):
+        """Recount everything from an iterable of report rows
+
+        Counts go into staging tables while live updates keep landing in
+        both, then the staging tables replace the live ones in one step.
+        Reports changed live during the rebuild keep their live state even
+        if the iterable yields an older copy of them later.
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False
+        try:
+            self._rebuild.update({'running': True, 'started_at': time.time(), 'finished_at': None,
+                                  'reports': 0, 'error': None})
+            conn = self._connection()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for table in ROLLUP_TABLES:
+                    conn.execute(f'DROP TABLE IF EXISTS {table}_staging')
+                conn.execute('DROP TABLE IF EXISTS report_dims_staging')
+                conn.execute('DROP TABLE IF EXISTS touched_staging')
+                self._create_tables(conn, '_staging')
+                conn.execute('CREATE TABLE touched_staging (id TEXT PRIMARY KEY) WITHOUT ROWID')
+
+            batch = []
+            for report in reports:
+                batch.append((report['id'], self.dimensions(report)))
+                if len(batch) >= 1000:
+                    self._apply_batch(conn, batch)
+                    batch = []
+            self._apply_batch(conn, batch)
+
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for table in list(ROLLUP_TABLES) + ['report_dims']:
+                    conn.execute(f'DROP TABLE {table}')
+                    conn.execute(f'ALTER TABLE {table}_staging RENAME TO {table}')
+                conn.execute('DROP TABLE touched_staging')
+            print(f"[ReportStats] Rebuilt rollups from {self._rebuild['reports']} reports")
+            return True
+        except Exception as e:
+            self._rebuild['error'] = str(e)
+            print(f"[ReportStats] Rebuild failed: {e}")
+            raise
+        finally:
+            self._rebuild.update({'running': False, 'finished_at': time.time()})
+            self._rebuild_lock.release()
+
+    def rebuild_status(self):
+        return dict(self._rebuild)
+
+    def _apply_batch(self, conn, batch):
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            for report_id, dims in batch:
+                if conn.execute('SELECT 1 FROM touched_staging WHERE id = ?', (report_id,)).fetchone() is None:
+                    self._apply(conn, '_staging', report_id, dims)
+        self._rebuild['reports'] += len(batch)
+
+    def _apply(self, conn, suffix, report_id, dims):
+        """Move report_id's count into the dims cell; caller holds a write transaction"""
+        row = conn.execute(
+            f'SELECT hour, geohash, urgency_level, animal_type, situation_type, status '
+            f'FROM report_dims{suffix} WHERE id = ?', (report_id,)
+        ).fetchone()
+        if row is not None and tuple(row) == dims:
+            return
+
+        for table, columns in ROLLUP_TABLES.items():
+            key = ' AND '.join(f'{column} = ?' for column in columns)
+            offset = len(dims) - len(columns)  # the totals table has no hour
+            if row is not None:
+                conn.execute(f'UPDATE {table}{suffix} SET count = count - 1 WHERE {key}', tuple(row)[offset:])
+                conn.execute(f'DELETE FROM {table}{suffix} WHERE {key} AND count <= 0', tuple(row)[offset:])
+            conn.execute(
+                f'INSERT INTO {table}{suffix} ({", ".join(columns)}, count) VALUES ({", ".join("?" for _ in columns)}, 1) '
+                f'ON CONFLICT DO UPDATE SET count = count + 1', dims[offset:]
+            )
+        conn.execute(
+            f'INSERT OR REPLACE INTO report_dims{suffix} '
+            f'(id, hour, geohash, urgency_level, animal_type, situation_type, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (report_id, *dims)
+        )
+
+    def _staging_exists(self, conn):
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'touched_staging'"
+        ).fetchone() is not None
+
+    def _create_tables(self, conn, suffix=''):
+        for table, columns in ROLLUP_TABLES.items():
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {table}{suffix} ({" TEXT, ".join(columns)} TEXT, count INTEGER, '
+                f'PRIMARY KEY ({", ".join(columns)})) WITHOUT ROWID'
+            )
+        conn.execute(
+            f'CREATE TABLE IF NOT EXISTS report_dims{suffix} ('
+            'id TEXT PRIMARY KEY, hour TEXT, geohash TEXT, urgency_level TEXT, animal_type TEXT, '
+            'situation_type TEXT, status TEXT) WITHOUT ROWID'
+        )
+
+    def _connection(self):
+        """One connection per thread and process; SQLite connections must not cross a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables(conn)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+# Global rollup counters
+report_stats = ReportStats()
@@ -0,0 +1,574 @@
+import os
+import json
+import time
+import atexit
+import heapq
+import bisect
+import threading
+
+from geo import SpatialGrid, report_point, in_area
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared by every process using the same path"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    def acquire(self, blocking=True):
+        if not self._thread_lock.acquire(blocking):
+            return False
+
+        if self._depth == 0:
+            try:
+                if not self._acquire_file(blocking):
+                    self._thread_lock.release()
+                    return False
+            except Exception:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+    def _acquire_file(self, blocking):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(self._fd, flags)
+                return True
+
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+                    return True
+                except OSError:
+                    if not blocking:
+                        raise
+                    time.sleep(0.01)
+        except OSError:
+            os.close(self._fd)
+            self._fd = None
+            if blocking:
+                raise
+            return False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class ReportStore:
+    """Append-only JSONL fallback store for reports, used while Supabase is unavailable
+
+    Records are appended to numbered segment files under a cross-process
+    lock. Every process keeps an in-memory offset index (by id, status and
+    created_at, plus a spatial grid over active reports) and catches up by
+    reading only the bytes other workers have appended since it last looked. Updates append a new version of the
+    record; the index always points at the latest one. When a segment is
+    sealed a compact ``.idx`` sidecar is written so startup does not have to
+    parse full report bodies.
+    """
+
+    def __init__(self, store_dir=None, segment_bytes=None, fsync_batch=None, fsync_interval_ms=None,
+                 legacy_file='reports_backup.json'):
+        self.store_dir = store_dir or os.getenv('REPORT_STORE_DIR', 'report_store')
+        self.segment_bytes = segment_bytes or int(os.getenv('REPORT_STORE_SEGMENT_BYTES', 64 * 1024 * 1024))
+        self.fsync_batch = fsync_batch or int(os.getenv('REPORT_STORE_FSYNC_BATCH', 32))
+        self.fsync_interval = (fsync_interval_ms or float(os.getenv('REPORT_STORE_FSYNC_INTERVAL_MS', 50))) / 1000
+        self.legacy_file = legacy_file
+
+        self._lock = threading.RLock()
+        self._file_lock = None
+        self._opened = False
+
+        # Offset index
+        self._by_id = {}           # id -> (segment, offset, length)
+        self._status = {}          # id -> status
+        self._by_status = {}       # status -> set of ids
+        self._by_created = []      # sorted [(created_at, id)]
+        self._status_created = {}  # status -> sorted [(created_at, id)]
+        self._created = {}         # id -> created_at
+        self._active_grid = SpatialGrid(cell_km=float(os.getenv('REPORT_STORE_GRID_KM', 1.0)))
+
+        # How far this process has read
+        self._tail_segment = 1
+        self._tail_offset = 0
+
+        # Writer state
+        self._writer = None
+        self._writer_segment = None
+        self._unsynced = 0
+        self._last_sync = time.time()
+        self._sync_timer = None
+        self._readers = {}
+
+    # ------------------------------------------------------------------ public
+
+    def append(self, report):
+        """Append a new report (or a new version of an existing one)"""
+        self.append_many([report])
+        return report
+
+    def append_many(self, reports):
+        """Append several reports under a single lock acquisition"""
+        if not reports:
+            return reports
+
+        self._open()
+        # Readers in this process catch up from _tail_offset under self._lock, so the write,
+        # its index entry and the offset update have to happen under it as one step
+        with self._file_lock, self._lock:
+            self._catch_up()
+            self._drop_torn_tail()
+            for report in reports:
+                self._write_record(report)
+            self._maybe_sync(len(reports))
+        return reports
+
+    def update(self, report_id, **changes):
+        """Append a new version of a report with the given fields changed"""
+        self._open()
+        with self._file_lock:
+            current = self.get(report_id)
+            if current is None:
+                return None
+            current.update(changes)
+            return self.append(current)
+
+    def get(self, report_id):
+        """Return the latest version of a report, or None"""
+        self._refresh()
+        with self._lock:
+            location = self._by_id.get(report_id)
+            if location is None:
+                return None
+            try:
+                return self._read_at(*location)
+            except ValueError as e:
+                print(f"[ReportStore] Unreadable record for {report_id} at {location}: {e}")
+                return None
+
+    def count(self, status=None):
+        """Number of distinct reports, optionally restricted to one status"""
+        self._refresh()
+        with self._lock:
+            if status is None:
+                return len(self._by_id)
+            return len(self._by_status.get(status, ()))
+
+    def iter_reports(self, status=None, newest_first=True):
+        """Yield the latest version of each report in created_at order"""
+        self._refresh()
+        with self._lock:
+            keys = list(reversed(self._by_created)) if newest_first else list(self._by_created)
+
+        for created_at, report_id in keys:
+            if status and self._status.get(report_id) != status:
+                continue
+            report = self.get(report_id)
+            if report is not None:
+                yield report
+
+    def position(self):
+        """Return the (segment, offset) just past the last complete record"""
+        self._refresh()
+        with self._lock:
+            return (self._tail_segment, self._tail_offset)
+
+    def iter_log(self, start=(1, 0), end=None):
+        """Yield (position, next_position, record) for every record version in log order"""
+        end = end or self.position()
+        segment, offset = start
+
+        while (segment, offset) < end:
+            path = self._segment_path(segment)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    for line in f:
+                        if (segment, offset) >= end or not line.endswith(b'\n'):
+                            break
+                        next_offset = offset + len(line)
+                        parsed = self._parse_line(line, segment, offset)
+                        if parsed is not None:
+                            skip, record = parsed
+                            yield (segment, offset + skip), (segment, next_offset), record
+                        offset = next_offset
+            if segment >= end[0]:
+                return
+            segment += 1
+            offset = 0
+
+    def is_latest(self, report_id, position):
+        """True if the record version at position is the current one for report_id"""
+        with self._lock:
+            location = self._by_id.get(report_id)
+            return location is not None and location[:2] == tuple(position)
+
+    def append_notification(self, row):
+        """Keep a notification log row for a report that only exists in this store"""
+        self.append_notifications([row])
+        return row
+
+    def append_notifications(self, rows):
+        """Keep notification log rows until the backlog replayer can insert them"""
+        self._open()
+        lines = ''.join(json.dumps(row, separators=(',', ':'), default=str) + '\n' for row in rows)
+        path = os.path.join(self.store_dir, 'notifications.jsonl')
+        with self._file_lock:
+            self._truncate_torn_tail(path)
+            with open(path, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        return rows
+
+    def notifications_position(self):
+        """Byte offset just past the last stored notification row"""
+        try:
+            return os.path.getsize(os.path.join(self.store_dir, 'notifications.jsonl'))
+        except FileNotFoundError:
+            return 0
+
+    def iter_notifications(self, start=0, end=None):
+        """Yield (next_offset, row) for stored notification rows between two offsets"""
+        end = self.notifications_position() if end is None else end
+        path = os.path.join(self.store_dir, 'notifications.jsonl')
+        if start >= end or not os.path.exists(path):
+            return
+
+        offset = start
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if offset >= end or not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    print(f"[ReportStore] Skipping corrupt notification row ending at offset {offset}")
+                    continue
+                yield offset, row
+
+    def page(self, status=None, before=None, limit=100, columns=None, bbox=None, near=None):
+        """Keyset page of reports newest first, strictly older than the (created_at, id) in `before`
+
+        Returns (reports, has_more). Starting a page is a bisect on the
+        created_at index (kept per status as well), so deep and filtered
+        pages cost the same as the first one.
+        When ``columns`` is given only those keys are kept in each report.
+
+        ``bbox`` (min_lat, min_lng, max_lat, max_lng) and ``near``
+        (lat, lng, radius_km) restrict the page to active reports in that
+        area; they are answered from the spatial grid, so the cost depends
+        on how many reports are in view rather than on the size of the store.
+        """
+        self._refresh()
+        with self._lock:
+            if bbox is not None or near is not None:
+                if status != 'active':
+                    raise ValueError('Spatial filters are only indexed for active reports')
+                keys = self._spatial_keys(before, limit, bbox, near)
+            else:
+                ordered = self._by_created if status is None else self._status_created.get(status, [])
+                end = len(ordered) if before is None else bisect.bisect_left(ordered, tuple(before))
+                keys = [report_id for created_at, report_id in reversed(ordered[max(end - limit - 1, 0):end])]
+
+        reports = [report for report in (self.get(report_id) for report_id in keys[:limit]) if report is not None]
+        if columns is not None:
+            reports = [{column: report[column] for column in columns if column in report} for report in reports]
+        return reports, len(keys) > limit
+
+    def sync(self):
+        """Flush appended records to disk"""
+        with self._lock:
+            if self._writer and self._unsynced:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+                self._unsynced = 0
+                self._last_sync = time.time()
+
+    # ---------------------------------------------------------------- internal
+
+    def _spatial_keys(self, before, limit, bbox, near):
+        """Newest limit + 1 active ids inside the area and older than `before`; caller holds the lock"""
+        if bbox is not None:
+            ids = (report_id for report_id, lat, lng in self._active_grid.query_bbox(*bbox)
+                   if near is None or in_area((lat, lng), near=near))
+        else:
+            ids = (report_id for report_id, distance in self._active_grid.query_radius(*near))
+
+        candidates = ((self._created[report_id] or '', report_id) for report_id in ids)
+        if before is not None:
+            before = tuple(before)
+            candidates = (key for key in candidates if key < before)
+        return [report_id for created_at, report_id in heapq.nlargest(limit + 1, candidates)]
+
+    def _open(self):
+        if self._opened:
+            return
+
+        with self._lock:
+            if self._opened:
+                return
+
+            os.makedirs(self.store_dir, exist_ok=True)
+            self._file_lock = FileLock(os.path.join(self.store_dir, 'store.lock'))
+
+            with self._file_lock:
+                self._load_sealed_indexes()
+                self._catch_up()
+                if not self._by_id and self._tail_segment == 1 and self._tail_offset == 0:
+                    self._migrate_legacy_file()
+
+            atexit.register(self.sync)
+            self._opened = True
+
+    def _refresh(self):
+        """Index records appended by other processes since our last look"""
+        self._open()
+        with self._lock:
+            try:
+                size = os.path.getsize(self._segment_path(self._tail_segment))
+            except FileNotFoundError:
+                size = 0
+            if size == self._tail_offset and not os.path.exists(self._segment_path(self._tail_segment + 1)):
+                return
+            # Readers never take the file lock; torn trailing lines are skipped until complete
+            self._catch_up()
+
+    def _segment_path(self, segment, suffix='jsonl'):
+        return os.path.join(self.store_dir, f'segment-{segment:06d}.{suffix}')
+
+    def _load_sealed_indexes(self):
+        """Load compact sidecar indexes for every sealed segment"""
+        segment = 1
+        while os.path.exists(self._segment_path(segment, 'idx')):
+            with open(self._segment_path(segment, 'idx'), 'r') as f:
+                for line in f:
+                    report_id, offset, length, status, created_at, *point = json.loads(line)
+                    if not point and status == 'active':
+                        # Sidecars written before the spatial index existed
+                        point = report_point(self._read_at(segment, offset, length))
+                    self._index(report_id, segment, offset, length, status, created_at, point or None)
+            segment += 1
+        self._tail_segment = segment
+        self._tail_offset = 0
+
+    def _catch_up(self):
+        """Read segments from our tail position to the end"""
+        with self._lock:
+            while True:
+                path = self._segment_path(self._tail_segment)
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        f.seek(self._tail_offset)
+                        for line in f:
+                            if not line.endswith(b'\n'):
+                                break  # torn write from a crashed writer; truncated by the next append
+                            parsed = self._parse_line(line, self._tail_segment, self._tail_offset)
+                            if parsed is not None:
+                                skip, record = parsed
+                                self._index(record['id'], self._tail_segment, self._tail_offset + skip,
+                                            len(line) - skip, record.get('status'), record.get('created_at'),
+                                            report_point(record))
+                            self._tail_offset += len(line)
+
+                if not os.path.exists(self._segment_path(self._tail_segment + 1)):
+                    return
+                self._tail_segment += 1
+                self._tail_offset = 0
+
+    @staticmethod
+    def _parse_line(line, segment, offset):
+        """(skip, record) for a complete log line, or None if it cannot be read
+
+        A line that is not valid JSON is usually a torn write from a crashed
+        writer with a later record appended after it (stores written before
+        torn tails were truncated); the record is recovered from the end of
+        the line, and ``skip`` is how many leading bytes belong to the torn
+        part.
+        """
+        try:
+            return 0, json.loads(line)
+        except ValueError:
+            pass
+
+        start = line.find(b'{', 1)
+        while start != -1:
+            try:
+                record = json.loads(line[start:])
+                if isinstance(record, dict) and 'id' in record:
+                    print(f"[ReportStore] Recovered record after {start} torn bytes in segment {segment} at {offset}")
+                    return start, record
+            except ValueError:
+                pass
+            start = line.find(b'{', start + 1)
+
+        print(f"[ReportStore] Skipping corrupt line in segment {segment} at {offset}")
+        return None
+
+    @staticmethod
+    def _truncate_torn_tail(path, block=4096):
+        """Cut an incomplete last line off a log file; caller holds the file lock"""
+        try:
+            f = open(path, 'rb+')
+        except FileNotFoundError:
+            return
+        with f:
+            size = end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(end - block, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+                print(f"[ReportStore] Truncated {size - end} torn bytes from {path}")
+
+    def _drop_torn_tail(self):
+        """Truncate the active segment to our caught-up tail; caller holds the file lock and self._lock
+
+        Anything past the tail is a torn line left by a crashed writer.
+        Appending after it would put the next record somewhere other than
+        where it is indexed.
+        """
+        path = self._segment_path(self._tail_segment)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return
+        if size > self._tail_offset:
+            print(f"[ReportStore] Truncating {size - self._tail_offset} torn bytes from {path}")
+            os.truncate(path, self._tail_offset)
+
+    def _index(self, report_id, segment, offset, length, status, created_at, point=None):
+        if report_id not in self._by_id:
+            bisect.insort(self._by_created, (created_at or '', report_id))
+            self._created[report_id] = created_at
+
+        known = report_id in self._by_id
+        previous = self._status.get(report_id)
+        key = (self._created[report_id] or '', report_id)
+        if known and previous != status:
+            self._by_status[previous].discard(report_id)
+            ordered = self._status_created[previous]
+            del ordered[bisect.bisect_left(ordered, key)]
+        if not known or previous != status:
+            bisect.insort(self._status_created.setdefault(status, []), key)
+        self._by_status.setdefault(status, set()).add(report_id)
+        self._status[report_id] = status
+        self._by_id[report_id] = (segment, offset, length)
+
+        if status == 'active' and point:
+            self._active_grid.add(report_id, *point)
+        else:
+            self._active_grid.remove(report_id)
+
+    def _write_record(self, report):
+        """Append one record to the active segment; caller holds the file lock and self._lock"""
+        line = (json.dumps(report, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+        if self._tail_offset + len(line) > self.segment_bytes and self._tail_offset > 0:
+            self._seal_segment(self._tail_segment)
+            self._tail_segment += 1
+            self._tail_offset = 0
+
+        if self._writer_segment != self._tail_segment:
+            if self._writer:
+                self.sync()
+                self._writer.close()
+            self._writer = open(self._segment_path(self._tail_segment), 'ab')
+            self._writer_segment = self._tail_segment
+
+        self._writer.write(line)
+        self._writer.flush()
+        self._index(report['id'], self._tail_segment, self._tail_offset, len(line),
+                    report.get('status'), report.get('created_at'), report_point(report))
+        self._tail_offset += len(line)
+
+    def _seal_segment(self, segment):
+        """Write the compact sidecar index for a full segment"""
+        self.sync()
+        entries = [
+            (report_id, location[1], location[2], self._status.get(report_id), created_at,
+             *(self._active_grid.get(report_id) or ()))
+            for created_at, report_id in self._by_created
+            for location in [self._by_id[report_id]]
+            if location[0] == segment
+        ]
+        entries.sort(key=lambda entry: entry[1])
+
+        tmp_path = self._segment_path(segment, 'idx.tmp')
+        with open(tmp_path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._segment_path(segment, 'idx'))
+
+    def _maybe_sync(self, appended):
+        """Group commit: fsync every N records or T milliseconds, whichever comes first"""
+        self._unsynced += appended
+        if self._unsynced >= self.fsync_batch or time.time() - self._last_sync >= self.fsync_interval:
+            self.sync()
+        elif self._sync_timer is None or not self._sync_timer.is_alive():
+            self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+            self._sync_timer.daemon = True
+            self._sync_timer.start()
+
+    def _read_at(self, segment, offset, length):
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = open(self._segment_path(segment), 'rb')
+            self._readers[segment] = reader
+        reader.seek(offset)
+        return json.loads(reader.read(length))
+
+    def _migrate_legacy_file(self):
+        """Import reports from the old single-file reports_backup.json"""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, 'r') as f:
+                reports = json.load(f)
+            for report in reports:
+                self._write_record(report)
+            self._maybe_sync(len(reports))
+            self.sync()
+            print(f"[ReportStore] Imported {len(reports)} reports from {self.legacy_file}")
+        except Exception as e:
+            print(f"[ReportStore] Failed to import {self.legacy_file}: {e}")
+
+
+# Global report store instance
+report_store = ReportStore()
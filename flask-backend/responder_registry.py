@@ -0,0 +1,136 @@
+import os
+import json
+import threading
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, report_point
+
+
+class ResponderRegistry:
+    """Rescue teams with their locations, capabilities and contact channels
+
+    Teams are read from a JSON file (a list of objects with id, name, lat,
+    lng, capabilities, email and phone) and reloaded whenever the file
+    changes. Team locations are held as unit vectors in NumPy arrays grouped
+    by capability. The nearest teams on the sphere are the ones with the
+    largest dot product with the report's vector, so routing is a single
+    matrix-vector product over that group plus an argpartition for the top
+    k; great-circle distances are only derived for those k.
+    """
+
+    def __init__(self, path=None, k=None, max_km=None):
+        self.path = path or os.getenv('RESPONDERS_FILE', 'responders.json')
+        self.k = k or int(os.getenv('RESPONDER_ROUTE_K', 3))
+        self.max_km = max_km or float(os.getenv('RESPONDER_MAX_KM', 50))
+
+        self._teams = []
+        self._groups = {}     # capability (None = any) -> (team indexes, n x 3 unit vectors)
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def load(self, teams):
+        """Replace the registry with a list of team dicts"""
+        teams = [team for team in teams if team.get('email') and report_point(team)]
+        points = np.array([report_point(team) for team in teams], dtype=np.float64).reshape(-1, 2)
+        vectors = self._unit_vectors(points[:, 0], points[:, 1])
+
+        members = {None: list(range(len(teams)))}
+        for index, team in enumerate(teams):
+            for capability in team.get('capabilities') or ():
+                members.setdefault(capability, []).append(index)
+
+        groups = {}
+        for capability, indexes in members.items():
+            indexes = np.array(indexes, dtype=np.int64)
+            groups[capability] = (indexes, np.ascontiguousarray(vectors[indexes]))
+
+        with self._lock:
+            self._teams, self._groups = teams, groups
+
+    def nearest(self, lat, lng, capability=None, k=None, max_km=None):
+        """Up to k teams with the capability (any team if None) within max_km, nearest first"""
+        self._reload_if_changed()
+        k = k or self.k
+        max_km = self.max_km if max_km is None else max_km
+
+        with self._lock:
+            teams, group = self._teams, self._groups.get(capability)
+        if group is None or not len(group[0]):
+            return []
+
+        indexes, vectors = group
+        similarity = vectors @ self._unit_vectors(np.array([lat]), np.array([lng]))[0]
+
+        if len(similarity) > k:
+            candidates = np.argpartition(-similarity, k)[:k]
+        else:
+            candidates = np.arange(len(similarity))
+        candidates = candidates[np.argsort(-similarity[candidates])]
+
+        # Chord length between unit vectors -> great-circle distance
+        chords = np.sqrt(np.maximum(2.0 - 2.0 * similarity[candidates], 0.0))
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chords / 2, 1.0))
+
+        return [
+            {**teams[indexes[i]], 'distance_km': round(float(distance), 2)}
+            for i, distance in zip(candidates, distances)
+            if distance <= max_km
+        ]
+
+    def route(self, report):
+        """Teams that should get the alert for a report: the nearest ones able to handle it
+
+        Uses the response_team suggested by the AI analysis as the required
+        capability and falls back to the nearest teams of any kind when no
+        suitable team is in range. Returns [] when the report has no
+        coordinates or no team is in range.
+        """
+        point = report_point(report)
+        if point is None:
+            return []
+
+        analysis = report.get('ai_analysis')
+        capability = analysis.get('response_team') if isinstance(analysis, dict) else None
+        if capability:
+            teams = self.nearest(point[0], point[1], capability)
+            if teams:
+                return teams
+        return self.nearest(point[0], point[1])
+
+    def stats(self):
+        self._reload_if_changed()
+        with self._lock:
+            return {
+                'teams': len(self._teams),
+                'capabilities': {capability: len(group[0]) for capability, group in self._groups.items() if capability},
+                'k': self.k,
+                'max_km': self.max_km
+            }
+
+    @staticmethod
+    def _unit_vectors(lat, lng):
+        lat_rad, lng_rad = np.radians(lat), np.radians(lng)
+        cos_lat = np.cos(lat_rad)
+        return np.column_stack((cos_lat * np.cos(lng_rad), cos_lat * np.sin(lng_rad), np.sin(lat_rad)))
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                teams = json.load(f)
+            self.load(teams)
+            print(f"[Responders] Loaded {len(self._teams)} teams from {self.path}")
+        except Exception as e:
+            print(f"[Responders] Failed to load {self.path}: {e}")
+        self._mtime = mtime
+
+
+# Global registry instance
+responder_registry = ResponderRegistry()
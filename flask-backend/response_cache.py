@@ -0,0 +1,101 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Short-lived cache of pre-serialized response bodies with strong ETags
+
+    Entries expire after ``ttl_seconds`` or as soon as invalidate() is
+    called in any worker: invalidation bumps the mtime of a shared
+    generation file, which every lookup compares with one stat call. A
+    per-key lock makes concurrent misses wait for a single rebuild instead
+    of all querying the database.
+    """
+
+    def __init__(self, name, ttl_seconds=None, max_entries=None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds or float(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 5))
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256))
+        self.generation_file = os.path.join(os.getenv('RESPONSE_CACHE_DIR', '.cache'), f'{name}.generation')
+
+        self._entries = OrderedDict()   # key -> (body, etag, stored_at, generation)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, key):
+        """Return (body, etag) if a fresh entry exists, else None"""
+        generation = self._generation()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[3] == generation and now - entry[2] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return entry[0], entry[1]
+            self._stats['misses'] += 1
+            return None
+
+    def get_or_build(self, key, build):
+        """Return (body, etag), calling build() -> bytes at most once per key at a time"""
+        cached = self.get(key)
+        if cached:
+            return cached
+
+        with self._lock_for(key):
+            # Another thread may have rebuilt the entry while we waited
+            cached = self.get(key)
+            if cached:
+                return cached
+            generation = self._generation()
+            body = build()
+            return self.set(key, body, generation)
+
+    def set(self, key, body, generation=None):
+        """Store a serialized body and return (body, etag)"""
+        etag = hashlib.sha1(body).hexdigest()
+        with self._lock:
+            self._entries[key] = (body, etag, time.time(), self._generation() if generation is None else generation)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def invalidate(self):
+        """Drop every entry in this process and in every other worker"""
+        with self._lock:
+            self._entries.clear()
+            self._stats['invalidations'] += 1
+        try:
+            os.makedirs(os.path.dirname(self.generation_file), exist_ok=True)
+            with open(self.generation_file, 'a'):
+                pass
+            os.utime(self.generation_file, ns=(time.time_ns(), time.time_ns()))
+        except OSError as e:
+            print(f"[ResponseCache] Failed to bump generation for {self.name}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'ttl_seconds': self.ttl_seconds}
+
+    def _generation(self):
+        try:
+            return os.stat(self.generation_file).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def _lock_for(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                if len(self._key_locks) > self.max_entries * 4:
+                    self._key_locks.clear()
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+
+# Cache for /api/reports/active responses
+active_reports_cache = ResponseCache('active_reports')
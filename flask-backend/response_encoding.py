@@ -0,0 +1,160 @@
+import os
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+
+# Optional speedups: each one falls back to the standard library when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Bodies worth compressing; images are already compressed and streams must not be buffered
+COMPRESSIBLE_MIMETYPES = ('application/json', MSGPACK_MIMETYPE, 'text/html', 'text/plain', 'text/csv',
+                          'image/svg+xml')
+
+
+def wants_msgpack():
+    """True if the current request prefers application/msgpack over JSON and msgpack is installed"""
+    if msgpack is None or not has_request_context():
+        return False
+    # JSON wins ties, so browsers sending */* keep getting JSON
+    return request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE]) == MSGPACK_MIMETYPE
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson and speaks msgpack on request
+
+    Output matches the default provider (sorted keys, dates as HTTP dates
+    through ``default``) but is produced by orjson straight to bytes. When
+    a client sends ``Accept: application/msgpack`` responses built with
+    jsonify are packed with msgpack instead. Without orjson or msgpack
+    installed it behaves like the default provider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def dumps_bytes(self, obj):
+        """Compact UTF-8 JSON bytes"""
+        if orjson is None:
+            return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def encode(self, obj):
+        """(body, mimetype) in the format the current request negotiated"""
+        if wants_msgpack():
+            return msgpack.packb(obj, default=self.default), MSGPACK_MIMETYPE
+        return self.dumps_bytes(obj), self.mimetype
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self._app.debug and self.compact is not False:
+            return super().response(obj)
+        body, mimetype = self.encode(obj)
+        response = self._app.response_class(body, mimetype=mimetype)
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+
+class ResponseCompressor:
+    """after_request hook compressing responses with brotli or gzip, as the client accepts
+
+    Only complete bodies of at least ``min_bytes`` with a compressible
+    mimetype are compressed; streamed responses (NDJSON exports, the SSE
+    feed) pass through untouched. Responses carrying an ETag are compressed
+    once per representation and kept in a small LRU, so repeated polls of a
+    cached page cost a lookup rather than a compression. Their ETag becomes
+    weak, which still matches If-None-Match.
+    """
+
+    def __init__(self, min_bytes=None, level=None, max_entries=None):
+        self.min_bytes = min_bytes or int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+        self.level = level or int(os.getenv('COMPRESS_LEVEL', 5))
+        self.max_entries = max_entries or int(os.getenv('COMPRESS_CACHE_ENTRIES', 256))
+
+        self._compressed = OrderedDict()   # (etag, encoding) -> body
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304) or response.is_streamed
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._negotiate()
+        if encoding is None or (response.content_length or 0) < self.min_bytes:
+            return response
+
+        etag, weak = response.get_etag()
+        body = self._cached(etag, encoding) if etag else None
+        if body is None:
+            body = self._encode(response.get_data(), encoding)
+            if etag:
+                self._store(etag, encoding, body)
+
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _negotiate(self):
+        accept = request.accept_encodings
+        if brotli is not None and accept['br']:
+            return 'br'
+        if accept['gzip']:
+            return 'gzip'
+        return None
+
+    def _encode(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.level)
+        return gzip.compress(data, compresslevel=min(self.level, 9), mtime=0)
+
+    def _cached(self, etag, encoding):
+        with self._lock:
+            body = self._compressed.get((etag, encoding))
+            if body is not None:
+                self._compressed.move_to_end((etag, encoding))
+            return body
+
+    def _store(self, etag, encoding, body):
+        with self._lock:
+            self._compressed[(etag, encoding)] = body
+            while len(self._compressed) > self.max_entries:
+                self._compressed.popitem(last=False)
+
+
+# Global response compressor
+response_compressor = ResponseCompressor()
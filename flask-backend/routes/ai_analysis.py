@@ -1,10 +1,39 @@
 from flask import Blueprint, request, jsonify
 import os
+import json
 import requests
-from groq import Groq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from keyword_classifier import keyword_classifier
+from llm_cache import llm_cache, prompt_key
+from outbound_clients import outbound_clients
 
 ai_bp = Blueprint('ai_analysis', __name__)
 
+AI_MODEL = "llama-3.3-70b-versatile"
+AI_TEMPERATURE = 0.3
+AI_SYSTEM_PROMPT = "You are an animal welfare expert. Provide brief, actionable analysis."
+
+def rule_based_analysis(description, location):
+    """Triage a lowercased description with the weighted keyword rules in analysis_rules.json"""
+    classification = keyword_classifier.classify(description)
+    analysis = {
+        'severity': 'medium',
+        'category': 'general',
+        'urgency_level': 'normal',
+        'response_team': 'animal_control',
+        'recommended_action': 'Standard response protocol recommended.',
+        'full_analysis': ''
+    }
+    analysis.update(classification['analysis'])
+    analysis['matched_terms'] = classification['matched_terms']
+    analysis['keyword_scores'] = classification['scores']
+    analysis['languages'] = classification['languages']
+    
+    # Add location-specific recommendations
+    if location:
+        analysis['full_analysis'] += f' Location: {location}. Coordinate with local authorities in this area.'
+    return analysis
+
 @ai_bp.route('/ai-analysis', methods=['POST'])
 def analyze_report():
     """AI Analysis of animal cruelty reports"""
@@ -21,64 +50,12 @@ def analyze_report():
         location = data.get('location', '')
         image_url = data.get('image_url', '')
         
-        # Simple rule-based analysis for immediate functionality
-        analysis = {
-            'severity': 'medium',
-            'category': 'general',
-            'urgency_level': 'normal',
-            'response_team': 'animal_control',
-            'recommended_action': 'Standard response protocol recommended.',
-            'full_analysis': ''
-        }
-        
-        # Emergency keywords
-        emergency_keywords = ['emergency', 'dying', 'bleeding', 'severe', 'critical', 'urgent', 'immediate', 'life-threatening']
-        high_keywords = ['injured', 'hurt', 'sick', 'abuse', 'neglect', 'abandoned', 'trapped', 'danger']
-        low_keywords = ['stray', 'lost', 'mild', 'minor', 'observation']
-        
-        # Determine severity based on keywords
-        if any(keyword in description for keyword in emergency_keywords):
-            analysis.update({
-                'severity': 'emergency',
-                'urgency_level': 'emergency',
-                'response_team': 'emergency_vet',
-                'recommended_action': 'IMMEDIATE ACTION REQUIRED: Contact emergency veterinary services and animal rescue teams immediately.',
-                'full_analysis': 'Emergency situation detected. Immediate veterinary attention and rescue response needed.'
-            })
-        elif any(keyword in description for keyword in high_keywords):
-            analysis.update({
-                'severity': 'high',
-                'urgency_level': 'high',
-                'response_team': 'veterinary_rescue',
-                'recommended_action': 'High priority response needed. Contact local animal welfare organizations and veterinary services.',
-                'full_analysis': 'High priority situation requiring prompt attention from qualified animal welfare professionals.'
-            })
-        elif any(keyword in description for keyword in low_keywords):
-            analysis.update({
-                'severity': 'low',
-                'urgency_level': 'low',
-                'response_team': 'animal_control',
-                'recommended_action': 'Standard monitoring and welfare check recommended.',
-                'full_analysis': 'Standard animal welfare check and monitoring recommended.'
-            })
-        else:
-            analysis.update({
-                'severity': 'normal',
-                'urgency_level': 'normal',
-                'response_team': 'animal_welfare',
-                'recommended_action': 'Regular animal welfare assessment recommended.',
-                'full_analysis': 'Standard animal welfare assessment and appropriate response measures recommended.'
-            })
-        
-        # Add location-specific recommendations
-        if location:
-            analysis['full_analysis'] += f' Location: {location}. Coordinate with local authorities in this area.'
+        analysis = rule_based_analysis(description, location)
         
         # Try Groq API as enhancement if available
         try:
             if os.getenv('GROQ_API_KEY'):
-                from groq import Groq
-                client = Groq(api_key=os.getenv('GROQ_API_KEY'))
+                client = outbound_clients.get('groq')
                 
                 prompt = f"""
                 Analyze this animal report and provide a brief assessment:
@@ -88,17 +65,22 @@ def analyze_report():
                 Provide severity (emergency/high/normal/low) and brief recommendation.
                 """
                 
-                chat_completion = client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": "You are an animal welfare expert. Provide brief, actionable analysis."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    model="llama-3.3-70b-versatile",
-                    temperature=0.3,
-                    max_tokens=200
-                )
+                messages = [
+                    {"role": "system", "content": AI_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ]
+                
+                def complete():
+                    chat_completion = client.chat.completions.create(
+                        messages=messages,
+                        model=AI_MODEL,
+                        temperature=AI_TEMPERATURE,
+                        max_tokens=200
+                    )
+                    return chat_completion.choices[0].message.content
                 
-                ai_response = chat_completion.choices[0].message.content
+                # Identical reports are answered from the cache instead of a new Groq call
+                ai_response = llm_cache.get_or_call(complete, AI_MODEL, AI_TEMPERATURE, messages, max_tokens=200)
                 analysis['ai_enhancement'] = ai_response
                 
         except Exception as ai_error:
@@ -117,3 +99,150 @@ def analyze_report():
             'message': 'Failed to analyze report',
             'error': str(e)
         }), 500
+
+def enhance_pack(client, pack):
+    """One Groq call assessing several reports; returns {index: assessment text}"""
+    listing = '\n'.join(
+        f'{index}. Description: {description}\n   Location: {location or "not given"}'
+        for index, description, location in pack
+    )
+    prompt = f"""
+    Analyze each numbered animal report and provide a brief assessment of each.
+    {listing}
+    
+    Reply with a JSON object of the form
+    {{"results": [{{"index": <report number>, "severity": "emergency|high|normal|low", "recommendation": "<one or two sentences>"}}]}}
+    with one entry per report.
+    """
+    
+    chat_completion = client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": AI_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        model=AI_MODEL,
+        temperature=AI_TEMPERATURE,
+        max_tokens=80 * len(pack) + 50,
+        response_format={"type": "json_object"}
+    )
+    
+    results = json.loads(chat_completion.choices[0].message.content).get('results', [])
+    wanted = {index for index, _, _ in pack}
+    enhancements = {}
+    for result in results:
+        if isinstance(result, dict) and result.get('index') in wanted:
+            enhancements[result['index']] = f"Severity: {result.get('severity', 'unknown')}. {result.get('recommendation', '')}".strip()
+    return enhancements
+
+def batch_cache_key(description, location):
+    """Cache key of one report's assessment within a packed batch call"""
+    messages = [{"role": "user", "content": f'Description: {description}\nLocation: {location or "not given"}'}]
+    return prompt_key(AI_MODEL, AI_TEMPERATURE, messages, response_format='batch')
+
+def enhance_batch(items):
+    """Groq assessments for (index, description, location) items, packed and sent concurrently
+
+    Returns {index: assessment text}. Reports assessed before are answered
+    from the LLM cache per report, so only new ones are packed into calls. A
+    pack whose call fails just leaves its reports with the rule-based analysis.
+    """
+    enhancements, keys, misses = {}, {}, []
+    for item in items:
+        index, description, location = item
+        if llm_cache.enabled:
+            keys[index] = batch_cache_key(description, location)
+            cached = llm_cache.get(keys[index])
+            if cached is not None:
+                enhancements[index] = cached
+                continue
+        misses.append(item)
+    if not misses:
+        return enhancements
+    
+    pack_size = int(os.getenv('AI_BATCH_PACK_SIZE', 20))
+    concurrency = int(os.getenv('AI_BATCH_CONCURRENCY', 4))
+    packs = [misses[start:start + pack_size] for start in range(0, len(misses), pack_size)]
+    client = outbound_clients.get('groq')
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='ai-batch') as executor:
+        futures = {executor.submit(enhance_pack, client, pack): pack for pack in packs}
+        for future in as_completed(futures):
+            try:
+                fetched = future.result()
+            except Exception as ai_error:
+                print(f"AI Enhancement failed for {len(futures[future])} reports (using fallback): {ai_error}")
+                continue
+            enhancements.update(fetched)
+            for index, enhancement in fetched.items():
+                if index in keys:
+                    llm_cache.set(keys[index], enhancement)
+    return enhancements
+
+@ai_bp.route('/ai-analysis/batch', methods=['POST'])
+def analyze_reports_batch():
+    """AI Analysis of many reports at once; results come back in input order"""
+    try:
+        data = request.get_json()
+        submissions = data.get('reports') if isinstance(data, dict) else None
+        
+        max_reports = int(os.getenv('AI_BATCH_MAX_REPORTS', 500))
+        if not isinstance(submissions, list) or not submissions:
+            return jsonify({
+                'success': False,
+                'message': 'reports must be a non-empty list'
+            }), 400
+        if len(submissions) > max_reports:
+            return jsonify({
+                'success': False,
+                'message': f'At most {max_reports} reports per batch'
+            }), 400
+        
+        # Rule-based triage for the whole batch first; it never waits on the LLM
+        results, pending = [], []
+        for index, submission in enumerate(submissions):
+            if not isinstance(submission, dict) or not isinstance(submission.get('description'), str):
+                results.append({'index': index, 'success': False, 'message': 'Description is required'})
+                continue
+            description = submission['description'].lower()
+            location = submission.get('location') or ''
+            result = {'index': index, 'success': True, 'analysis': rule_based_analysis(description, location)}
+            if 'id' in submission:
+                result['id'] = submission['id']
+            results.append(result)
+            pending.append((index, description, location))
+        
+        if pending and os.getenv('GROQ_API_KEY') and data.get('enhance', True):
+            for index, enhancement in enhance_batch(pending).items():
+                results[index]['analysis']['ai_enhancement'] = enhancement
+        
+        return jsonify({
+            'success': True,
+            'total': len(results),
+            'analyzed': len(pending),
+            'enhanced': sum(1 for result in results if 'ai_enhancement' in result.get('analysis', {})),
+            'results': results
+        })
+        
+    except Exception as e:
+        print(f"Batch AI Analysis Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to analyze reports',
+            'error': str(e)
+        }), 500
+
+@ai_bp.route('/ai-analysis/cache', methods=['GET'])
+def ai_cache_stats():
+    """Hit rate and size of the Groq response cache"""
+    try:
+        return jsonify({
+            'success': True,
+            'cache': llm_cache.stats()
+        })
+    except Exception as e:
+        print(f"AI Cache Stats Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to read AI cache stats',
+            'error': str(e)
+        }), 500
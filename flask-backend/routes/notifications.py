@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify
 import os
-import requests
-from twilio.rest import Client as TwilioClient
+from outbound_clients import outbound_clients
 
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -46,7 +45,7 @@ def send_email_notification():
             'textContent': f"New Animal Rescue Report #{data['report_id']} - {data.get('description', 'N/A')}"
         }
         
-        response = requests.post(url, headers=headers, json=email_data)
+        response = outbound_clients.session().post(url, headers=headers, json=email_data)
         
         if response.status_code in [200, 201]:
             return jsonify({
@@ -85,11 +84,9 @@ def send_whatsapp_notification():
             }), 400
         
         # Twilio configuration
-        account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-        auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         from_whatsapp = os.getenv('TWILIO_WHATSAPP_NUMBER')
         
-        client = TwilioClient(account_sid, auth_token)
+        client = outbound_clients.get('twilio')
         
         # Get report details for template
         report_id = data.get('report_id', 'Unknown')
@@ -1,343 +1,1418 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 import os
+import json
 import uuid
-from datetime import datetime, timedelta
-from supabase import create_client, Client
+import time
+import base64
+import threading
+from datetime import datetime, timedelta, timezone
+from supabase import Client
 import requests
-from email_service import send_rescue_team_email, send_user_confirmation_email
+from email_service import (
+    send_rescue_team_email,
+    send_user_confirmation_email,
+    send_rescue_team_emails,
+    send_user_confirmation_emails
+)
+from notification_outbox import notification_outbox
+from report_store import report_store
+from backlog_replay import backlog_replayer
+from idempotency import idempotent, idempotency_store
+from duplicate_detector import duplicate_detector
+from geo import parse_coordinates, parse_bbox, bbox_around, report_point, in_area
+from circuit_breaker import supabase_breaker, CircuitOpenError
+from notification_log import notification_log
+from response_cache import active_reports_cache
+from response_encoding import wants_msgpack, MSGPACK_MIMETYPE
+from report_events import report_events, parse_event_id, REPORT_CREATED, REPORT_STATUS_CHANGED
+from marker_clusters import marker_clusters
+from heatmap import report_heatmap, epoch_seconds, tile_in_range
+from responder_registry import responder_registry
+from search_index import report_search_index
+from report_stats import report_stats, hour_bucket, DIMENSIONS as STATS_DIMENSIONS
+from outbound_clients import outbound_clients
 
 reports_bp = Blueprint('reports', __name__)
 
-# Initialize Supabase client
-supabase: Client = create_client(
-    os.getenv('SUPABASE_URL'),
-    os.getenv('SUPABASE_API_KEY')
-)
+REPORT_STATUSES = ('active', 'in_progress', 'resolved', 'closed')
+URGENCY_LEVELS = ('low', 'normal', 'high', 'emergency')
+
+# Supabase client, built once per worker process by the outbound client registry
+supabase: Client = outbound_clients.proxy('supabase')
+
+# Fail fast while Supabase is unreachable; a background probe closes the circuit again
+supabase_breaker.set_probe(lambda: supabase.table('reports').select('id').limit(1).execute())
+
+# Replay reports saved to the fallback store once Supabase is reachable again
+backlog_replayer.configure(supabase, breaker=supabase_breaker)
+
+# Batch notifications table writes; rows that cannot be written wait in the store
+notification_log.configure(supabase, breaker=supabase_breaker, spill=report_store.append_notifications)
+
+@reports_bp.before_app_request
+def start_background_replay():
+    backlog_replayer.ensure_started()
+
+def build_report_record(data):
+    """Validate a submission and convert it to a 'reports' row; returns (report_data, error)"""
+    # Validate required fields
+    if not isinstance(data, dict) or 'description' not in data or 'location' not in data:
+        return None, 'Description and location are required'
+
+    # Generate report ID
+    report_id = str(uuid.uuid4())
+
+    # Prepare report data for new 'reports' table schema
+    # Convert coordinates to POINT (longitude, latitude) if provided as {lat, lng}
+    coords = data.get('coordinates')
+    point = None
+    if coords and isinstance(coords, dict) and 'lat' in coords and 'lng' in coords:
+        # Use the Postgres tuple format: (lng, lat)
+        point = f"({coords['lng']}, {coords['lat']})"
+    # Plain lat/lng columns back the bbox and radius filters
+    lat_lng = parse_coordinates(coords) if isinstance(coords, dict) else None
+
+    report_data = {
+        'id': report_id,  # Only include if you're setting a custom ID
+        'description': data['description'],
+        'location': data['location'],
+        'coordinates': point,
+        'lat': lat_lng[0] if lat_lng else None,
+        'lng': lat_lng[1] if lat_lng else None,
+        'contact_name': data.get('contact_name') or None,
+        'contact_email': data.get('contact_email') or None,
+        'contact_phone': data.get('contact_phone') or None,
+        'urgency_level': data.get('urgency_level') or 'normal',
+        'animal_type': data.get('animal_type') or None,
+        'situation_type': data.get('situation_type') or None,
+        'image_url': data.get('image_url') or None,
+        'ai_analysis': data.get('ai_analysis') or None,
+        'status': 'active'
+    }
+    return report_data, None
+
+def parse_timestamp(value):
+    """Convert an ISO created_at (naive local or with offset) to a POSIX timestamp"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def load_recent_reports(since):
+    """Active reports created after `since`, from Supabase or the fallback store"""
+    try:
+        # Built inside the breaker call so a failure anywhere in the request counts against the circuit
+        def fetch():
+            return supabase.table('reports') \
+                .select('id,description,coordinates,animal_type,duplicate_of,created_at') \
+                .eq('status', 'active') \
+                .gte('created_at', since.isoformat()) \
+                .execute()
+        result = supabase_breaker.call(fetch)
+        return result.data or []
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+    recent = []
+    for report in report_store.iter_reports(status='active'):
+        created_ts = parse_timestamp(report.get('created_at'))
+        if created_ts is None or created_ts < since.timestamp():
+            break
+        recent.append(report)
+    return recent
+
+def ensure_duplicate_index():
+    """Load recent active reports into the duplicate detector once per process"""
+    if duplicate_detector.warmed or not duplicate_detector.enabled:
+        return
+
+    since = datetime.now() - timedelta(seconds=duplicate_detector.window_seconds)
+    indexed = []
+    for report in load_recent_reports(since):
+        coords = parse_coordinates(report.get('coordinates'))
+        created_ts = parse_timestamp(report.get('created_at'))
+        if coords and created_ts:
+            indexed.append({
+                'id': report['id'],
+                'lat': coords[0],
+                'lng': coords[1],
+                'description': report.get('description'),
+                'animal_type': report.get('animal_type'),
+                'duplicate_of': report.get('duplicate_of'),
+                'created_ts': created_ts
+            })
+    duplicate_detector.warm(indexed)
+
+def link_duplicate(report_data, coords):
+    """Point report_data at the canonical report if it repeats a recent nearby one"""
+    if coords is None:
+        return None
+
+    try:
+        ensure_duplicate_index()
+        # Pick up reports other workers saved since the last poll of the shared event log
+        report_events.refresh()
+        match = duplicate_detector.find_duplicate(
+            coords[0], coords[1], report_data['description'], report_data.get('animal_type')
+        )
+        if match:
+            report_data['duplicate_of'] = match[0]
+        duplicate_detector.add(
+            report_data['id'], coords[0], coords[1], report_data['description'],
+            duplicate_of=report_data.get('duplicate_of'), animal_type=report_data.get('animal_type')
+        )
+        return report_data.get('duplicate_of')
+    except Exception as e:
+        print(f"Duplicate check failed: {str(e)}")
+        return None
+
+def persist_reports(reports):
+    """Insert reports with one PostgREST call, falling back to the local store; returns saved_to_db"""
+    # PostgREST multi-row inserts need every row to carry the same keys
+    columns = set().union(*(report_data.keys() for report_data in reports))
+    for report_data in reports:
+        for column in columns:
+            report_data.setdefault(column, None)
+
+    # Try to save to Supabase first
+    try:
+        # Use the new 'reports' table
+        result = supabase_breaker.call(lambda: supabase.table('reports').insert(reports).execute())
+        if result.data:
+            return True
+    except CircuitOpenError:
+        pass
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+    # If database failed, append to the local fallback store
+    created_at = datetime.now().isoformat()
+    for report_data in reports:
+        report_data['created_at'] = created_at
+    report_store.append_many(reports)
+    return False
+
+def build_notification_jobs(report_data, saved_to_db):
+    """Build the outbox jobs a new report fans out to"""
+    report_id = report_data['id']
+    jobs = []
+
+    # WhatsApp receipt to user if phone number provided
+    if report_data.get('contact_phone'):
+        jobs.append(notification_outbox.make_job(
+            report_id, 'whatsapp_receipt', 'whatsapp', report_data['contact_phone'],
+            {
+                'phone_number': report_data['contact_phone'],
+                'report_id': report_id,
+                'description': report_data['description']
+            },
+            log_to_db=saved_to_db
+        ))
+
+    # Email notification to the nearest suitable rescue teams (or the default
+    # address); duplicates were already escalated with their canonical
+    # report, so only the reporter hears back
+    if not report_data.get('duplicate_of'):
+        teams = responder_registry.route(report_data)
+        for team in teams:
+            jobs.append(notification_outbox.make_job(
+                report_id, 'rescue_team_email', 'email', team['email'],
+                {
+                    'report_id': report_id,
+                    'report_data': report_data,
+                    'recipient': team['email'],
+                    'team': {'id': team.get('id'), 'name': team.get('name'), 'distance_km': team['distance_km']}
+                },
+                log_to_db=saved_to_db
+            ))
+        if not teams:
+            default_email = os.getenv('DEFAULT_RESCUE_EMAIL', 'siesgauravpatil@gmail.com')
+            jobs.append(notification_outbox.make_job(
+                report_id, 'rescue_team_email', 'email', default_email,
+                {'report_id': report_id, 'report_data': report_data},
+                log_to_db=saved_to_db
+            ))
+
+    # Email confirmation to user if email provided
+    if report_data.get('contact_email'):
+        jobs.append(notification_outbox.make_job(
+            report_id, 'user_email_confirmation', 'email', report_data['contact_email'],
+            {
+                'email': report_data['contact_email'],
+                'report_id': report_id,
+                'report_data': report_data
+            },
+            log_to_db=saved_to_db
+        ))
+
+    return jobs
+
+def queue_notifications(jobs):
+    """Hand jobs to the outbox; returns the job types that were queued"""
+    try:
+        notification_outbox.enqueue(jobs)
+        return [job['type'] for job in jobs]
+    except Exception as e:
+        print(f"Failed to queue notifications: {str(e)}")
+        return []
 
 @reports_bp.route('/save-report', methods=['POST'])
+@idempotent('save-report')
 def save_report():
     """Save a new animal cruelty report and send notifications"""
     try:
         data = request.get_json()
         
-        # Validate required fields
-        if not data or 'description' not in data or 'location' not in data:
+        report_data, error = build_report_record(data)
+        if error:
             return jsonify({
                 'success': False,
-                'message': 'Description and location are required'
+                'message': error
             }), 400
         
-        # Generate report ID
-        report_id = str(uuid.uuid4())
-
-        # Get user_id from request headers or session if available (for RLS)
-        user_id = data.get('user_id')
-
-        # Prepare report data for new 'reports' table schema
-        # Convert coordinates to POINT (longitude, latitude) if provided as {lat, lng}
-        coords = data.get('coordinates')
-        point = None
-        if coords and isinstance(coords, dict) and 'lat' in coords and 'lng' in coords:
-            # Use the Postgres tuple format: (lng, lat)
-            point = f"({coords['lng']}, {coords['lat']})"
-
-        report_data = {
-            'id': report_id,  # Only include if you're setting a custom ID
-            'description': data['description'],
-            'location': data['location'],
-            'coordinates': point,
-            'contact_name': data.get('contact_name') or None,
-            'contact_email': data.get('contact_email') or None,
-            'contact_phone': data.get('contact_phone') or None,
-            'urgency_level': data.get('urgency_level') or 'normal',
-            'animal_type': data.get('animal_type') or None,
-            'situation_type': data.get('situation_type') or None,
-            'image_url': data.get('image_url') or None,
-            'ai_analysis': data.get('ai_analysis') or None,
-            'status': 'active'
-        }
+        # Link likely duplicates of a recent nearby report to the canonical one
+        duplicate_of = link_duplicate(report_data, parse_coordinates(data.get('coordinates')))
         
-        # Try to save to Supabase first
-        saved_to_db = False
-        try:
-            # Use the new 'reports' table
-            result = supabase.table('reports').insert(report_data).execute()
-            if result.data:
-                saved_to_db = True
-                saved_report = result.data[0]
-        except Exception as db_error:
-            print(f"Database error: {str(db_error)}")
+        saved_to_db = persist_reports([report_data])
+        report_events.publish(REPORT_CREATED, report_data)
         
-        # If database failed, save to backup file
-        if not saved_to_db:
-            import json
-            reports_file = 'reports_backup.json'
+        # Queue notifications; the outbox workers deliver them after we respond
+        notifications_queued = queue_notifications(build_notification_jobs(report_data, saved_to_db))
+        
+        return jsonify({
+            'success': True,
+            'report_id': report_data['id'],
+            'message': 'Report saved successfully',
+            'notifications_queued': notifications_queued,
+            'saved_to_database': saved_to_db,
+            'duplicate_of': duplicate_of
+        })
             
-            if os.path.exists(reports_file):
-                with open(reports_file, 'r') as f:
-                    reports = json.load(f)
+    except Exception as e:
+        print(f"Save Report Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to save report',
+            'error': str(e)
+        }), 500
+
+@reports_bp.route('/save-reports/bulk', methods=['POST'])
+@idempotent('save-reports-bulk')
+def save_reports_bulk():
+    """Save a batch of reports with one insert and queue their notifications together"""
+    try:
+        data = request.get_json()
+        max_reports = int(os.getenv('BULK_MAX_REPORTS', 1000))
+        
+        submissions = data.get('reports') if isinstance(data, dict) else None
+        if not isinstance(submissions, list) or len(submissions) == 0:
+            return jsonify({
+                'success': False,
+                'message': 'reports must be a non-empty array'
+            }), 400
+        
+        if len(submissions) > max_reports:
+            return jsonify({
+                'success': False,
+                'message': f'At most {max_reports} reports can be submitted at once'
+            }), 413
+        
+        # Validate everything up front; invalid items are reported, not inserted
+        results = []
+        valid_reports = []
+        for index, submission in enumerate(submissions):
+            report_data, error = build_report_record(submission)
+            if error:
+                results.append({'index': index, 'success': False, 'message': error})
             else:
-                reports = []
-            
-            report_data['created_at'] = datetime.now().isoformat()
-            reports.append(report_data)
-            
-            with open(reports_file, 'w') as f:
-                json.dump(reports, f, indent=2)
+                duplicate_of = link_duplicate(report_data, parse_coordinates(submission.get('coordinates')))
+                results.append({
+                    'index': index,
+                    'success': True,
+                    'report_id': report_data['id'],
+                    'duplicate_of': duplicate_of
+                })
+                valid_reports.append(report_data)
         
-        # Send notifications
-        notifications_sent = []
+        if not valid_reports:
+            return jsonify({
+                'success': False,
+                'message': 'No valid reports in batch',
+                'results': results
+            }), 400
         
-        # Send WhatsApp receipt to user if phone number provided
-        if data.get('contact_phone'):
-            try:
-                whatsapp_result = send_whatsapp_receipt(
-                    phone_number=data['contact_phone'],
-                    report_id=report_id,
-                    description=data['description']
-                )
-                if whatsapp_result.get('success'):
-                    notifications_sent.append('whatsapp_receipt')
-                    
-                    # Log notification in database if available
-                    if saved_to_db:
-                        try:
-                            supabase.table('notifications').insert({
-                                'report_id': report_id,
-                                'notification_type': 'whatsapp',
-                                'recipient': data['contact_phone'],
-                                'status': 'sent',
-                                'message_id': whatsapp_result.get('message_id'),
-                                'sent_at': datetime.now().isoformat()
-                            }).execute()
-                        except:
-                            pass
-                        
-            except Exception as e:
-                print(f"WhatsApp notification failed: {str(e)}")
-        
-        # Send email notification to rescue team
-        try:
-            email_result = send_rescue_team_email(
-                report_id=report_id,
-                report_data=report_data
-            )
-            if email_result.get('success'):
-                notifications_sent.append('rescue_team_email')
-                
-                # Log notification in database if available
-                if saved_to_db:
-                    try:
-                        supabase.table('notifications').insert({
-                            'report_id': report_id,
-                            'notification_type': 'email',
-                            'recipient': os.getenv('DEFAULT_RESCUE_EMAIL', 'rescue@animalwelfare.org'),
-                            'status': 'sent',
-                            'message_id': email_result.get('message_id'),
-                            'sent_at': datetime.now().isoformat()
-                        }).execute()
-                    except:
-                        pass
-                    
-        except Exception as e:
-            print(f"Email notification failed: {str(e)}")
+        saved_to_db = persist_reports(valid_reports)
+        for report_data in valid_reports:
+            report_events.publish(REPORT_CREATED, report_data)
         
-        # Send email confirmation to user if email provided
-        if data.get('contact_email'):
-            try:
-                user_email_result = send_user_confirmation_email(
-                    email=data['contact_email'],
-                    report_id=report_id,
-                    report_data=report_data
-                )
-                if user_email_result.get('success'):
-                    notifications_sent.append('user_email_confirmation')
-                    
-                    # Log notification in database if available
-                    if saved_to_db:
-                        try:
-                            supabase.table('notifications').insert({
-                                'report_id': report_id,
-                                'notification_type': 'email',
-                                'recipient': data['contact_email'],
-                                'status': 'sent',
-                                'message_id': user_email_result.get('message_id'),
-                                'sent_at': datetime.now().isoformat()
-                            }).execute()
-                        except:
-                            pass
-                        
-            except Exception as e:
-                print(f"User email confirmation failed: {str(e)}")
+        jobs = []
+        for report_data in valid_reports:
+            jobs.extend(build_notification_jobs(report_data, saved_to_db))
+        queued = queue_notifications(jobs)
+        
+        queued_by_report = {}
+        if queued:
+            for job in jobs:
+                queued_by_report.setdefault(job['report_id'], []).append(job['type'])
+        for result in results:
+            if result['success']:
+                result['notifications_queued'] = queued_by_report.get(result['report_id'], [])
         
         return jsonify({
             'success': True,
-            'report_id': report_id,
-            'message': 'Report saved successfully',
-            'notifications_sent': notifications_sent,
-            'saved_to_database': saved_to_db
+            'message': f'{len(valid_reports)} of {len(submissions)} reports saved',
+            'saved': len(valid_reports),
+            'failed': len(submissions) - len(valid_reports),
+            'saved_to_database': saved_to_db,
+            'results': results
         })
             
     except Exception as e:
-        print(f"Save Report Error: {str(e)}")
+        print(f"Bulk Save Error: {str(e)}")
         return jsonify({
             'success': False,
-            'message': 'Failed to save report',
+            'message': 'Failed to save reports',
             'error': str(e)
         }), 500
 
+# Public report fields: how each is built from a reports row, and the columns it needs
+REPORT_FIELDS = {
+    'id': (('id',), lambda report: report.get('id') or str(uuid.uuid4())),  # Generate new ID if missing
+    'description': (('description',), lambda report: report.get('description', 'No description provided')),
+    'location': (('location',), lambda report: report.get('location', 'Location not specified')),
+    'coordinates': (('coordinates',), lambda report: report.get('coordinates', {'lat': 40.7128, 'lng': -74.0060})),
+    'urgency_level': (('urgency_level',), lambda report: report.get('urgency_level', 'normal')),
+    'animal_type': (('animal_type',), lambda report: report.get('animal_type')),
+    'situation_type': (('situation_type',), lambda report: report.get('situation_type')),
+    'created_at': (('created_at',), lambda report: report.get('created_at') or datetime.now().isoformat()),
+    'contact_info': (('contact_name', 'contact_email', 'contact_phone'), lambda report: {
+        'name': report.get('contact_name'),
+        'email': report.get('contact_email'),
+        'phone': report.get('contact_phone')
+    }),
+    'image_url': (('image_url',), lambda report: report.get('image_url')),
+    'ai_analysis': (('ai_analysis',), lambda report: report.get('ai_analysis'))
+}
+
+# view=markers: one positional row per report, just enough to draw the map
+MARKER_FIELDS = ('id', 'coordinates', 'urgency_level', 'animal_type')
+MARKER_COLUMNS = ['id', 'lat', 'lng', 'urgency_level', 'animal_type']
+
+def format_report(report, fields=None):
+    """Shape a reports row (from Supabase or the fallback store) for the frontend"""
+    return {field: REPORT_FIELDS[field][1](report) for field in (fields or REPORT_FIELDS)}
+
+def format_marker(report):
+    """[id, lat, lng, urgency_level, animal_type] for a reports row, or None without coordinates"""
+    coords = report_point(report)
+    if coords is None:
+        return None
+    return [report.get('id'), round(coords[0], 6), round(coords[1], 6),
+            report.get('urgency_level', 'normal'), report.get('animal_type')]
+
+def parse_view_args(args):
+    """Read fields and view query parameters into (fields or None, view); raises ValueError on bad input"""
+    view = args.get('view', 'full')
+    if view == 'markers':
+        return MARKER_FIELDS, view
+    if view != 'full':
+        raise ValueError('view must be full or markers')
+
+    requested = [field.strip() for field in args.get('fields', '').split(',') if field.strip()]
+    if not requested:
+        return None, view
+    unknown = [field for field in requested if field not in REPORT_FIELDS]
+    if unknown:
+        raise ValueError(f'unknown fields: {", ".join(unknown)}')
+    return tuple(dict.fromkeys(requested)), view
+
+def parse_area_args(args):
+    """Read bbox and near/radius_km query parameters into (bbox or None, near or None)
+
+    bbox is west,south,east,north; near is lat,lng with radius_km
+    (default 5). Raises ValueError on bad input.
+    """
+    bbox = parse_bbox(args['bbox']) if args.get('bbox') else None
+
+    near = None
+    if args.get('near'):
+        parts = args['near'].split(',')
+        center = parse_coordinates({'lat': parts[0], 'lng': parts[1]}) if len(parts) == 2 else None
+        if center is None:
+            raise ValueError('near must be lat,lng')
+        radius_km = float(args.get('radius_km', 5))
+        if radius_km <= 0:
+            raise ValueError('radius_km must be positive')
+        near = (center[0], center[1], radius_km)
+    elif args.get('radius_km'):
+        raise ValueError('radius_km needs near')
+
+    return bbox, near
+
+def report_columns(fields, near=None):
+    """Columns to read for the requested fields; id and created_at are always needed for the cursor"""
+    if fields is None:
+        return None
+    columns = ['id', 'created_at']
+    if near is not None:
+        # The exact radius check runs on our side
+        columns.extend(['lat', 'lng', 'coordinates'])
+    for field in fields:
+        columns.extend(column for column in REPORT_FIELDS[field][0] if column not in columns)
+    return columns
+
+def page_payload(rows, fields, view, formatter=format_report):
+    """The reports (or markers) part of an active reports response"""
+    if view == 'markers':
+        markers = [marker for marker in (format_marker(row) for row in rows) if marker is not None]
+        return {'view': view, 'columns': MARKER_COLUMNS, 'markers': markers, 'total': len(markers)}
+
+    reports = []
+    for row in rows:
+        try:
+            reports.append(formatter(row, fields))
+        except Exception as report_error:
+            print(f"Error processing report: {str(report_error)}")
+            print(f"Problematic report data: {row}")
+    return {'reports': reports, 'total': len(reports)}
+
+def encode_cursor(report):
+    """Opaque keyset cursor pointing just after this report"""
+    raw = json.dumps([report.get('created_at'), report.get('id')])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) a cursor points after; raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, report_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(report_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_page_args(args):
+    """Read limit and cursor query parameters; raises ValueError on bad input"""
+    default_size = int(os.getenv('REPORTS_PAGE_SIZE', 100))
+    max_size = int(os.getenv('REPORTS_MAX_PAGE_SIZE', 500))
+    limit = int(args.get('limit', default_size))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    cursor = args.get('cursor')
+    return min(limit, max_size), decode_cursor(cursor) if cursor else None
+
+def keyset_filter(cursor):
+    """PostgREST or-filter selecting rows after the cursor in (created_at, id) DESC order"""
+    created_at, report_id = cursor
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{report_id})'
+
+def load_active_reports(limit, cursor, fields=None, view='full', bbox=None, near=None):
+    """Build one page of the active reports payload from Supabase, the fallback store or demo data"""
+    columns = report_columns(fields, near)
+
+    # Try to fetch from Supabase first
+    try:
+        # A radius is searched as its enclosing box on the lat/lng index, then trimmed exactly
+        area = bbox or (bbox_around(*near) if near else None)
+
+        def fetch():
+            query = supabase.table('reports').select(','.join(columns) if columns else '*').eq('status', 'active') \
+                .order('created_at', desc=True).order('id', desc=True).limit(limit + 1)
+            if cursor:
+                query = query.or_(keyset_filter(cursor))
+            if area:
+                min_lat, min_lng, max_lat, max_lng = area
+                query = query.gte('lat', min_lat).lte('lat', max_lat).gte('lng', min_lng).lte('lng', max_lng)
+            return query.execute()
+        result = supabase_breaker.call(fetch)
+
+        # An empty first page falls through to the backup store and demo data,
+        # unless the client asked for an area that simply has no reports
+        if hasattr(result, 'data') and (result.data or cursor or area):
+            rows = result.data[:limit]
+            has_more = len(result.data) > limit
+            in_view = [row for row in rows if in_area(report_point(row), near=near)] if near else rows
+            return {
+                'success': True,
+                **page_payload(in_view, fields, view),
+                'has_more': has_more,
+                'next_cursor': encode_cursor(rows[-1]) if has_more else None
+            }
+
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+    # If database fails, try to load from the fallback store
+    try:
+        if report_store.count('active'):
+            # Same keyset semantics over the store's created_at index
+            stored, has_more = report_store.page(status='active', before=cursor, limit=limit, columns=columns,
+                                                 bbox=bbox, near=near)
+
+            return {
+                'success': True,
+                **page_payload(stored, fields, view),
+                'has_more': has_more,
+                'next_cursor': encode_cursor(stored[-1]) if has_more else None,
+                'source': 'backup_file'
+            }
+    except Exception as file_error:
+        print(f"Backup store error: {str(file_error)}")
+
+    # Fallback to demo data for NYC area
+    demo_reports = [
+        {
+            'id': 'demo-001',
+            'description': 'Injured stray dog found in Central Park. Appears to have a leg injury and is limping. The dog seems friendly but scared.',
+            'location': 'Central Park, Manhattan, New York, NY',
+            'coordinates': {'lat': 40.7829, 'lng': -73.9654},
+            'urgency_level': 'high',
+            'animal_type': 'dog',
+            'situation_type': 'injury',
+            'created_at': datetime.now().isoformat(),
+            'contact_info': {
+                'name': 'Demo Reporter',
+                'email': 'demo@example.com',
+                'phone': '+1-555-0123'
+            },
+            'image_url': None,
+            'ai_analysis': {'severity': 'high', 'confidence': 0.85}
+        },
+        {
+            'id': 'demo-002',
+            'description': 'Cat stuck in tree for over 24 hours. Owner reports the cat has not eaten and appears weak.',
+            'location': 'Brooklyn Bridge Park, Brooklyn, NY',
+            'coordinates': {'lat': 40.7023, 'lng': -73.9969},
+            'urgency_level': 'normal',
+            'animal_type': 'cat',
+            'situation_type': 'rescue',
+            'created_at': (datetime.now() - timedelta(hours=2)).isoformat(),
+            'contact_info': {
+                'name': 'Demo Reporter 2',
+                'email': 'demo2@example.com',
+                'phone': '+1-555-0124'
+            },
+            'image_url': None,
+            'ai_analysis': {'severity': 'medium', 'confidence': 0.75}
+        }
+    ]
+
+    if bbox or near:
+        demo_reports = [report for report in demo_reports
+                        if in_area(report_point(report), bbox, near)]
+
+    return {
+        'success': True,
+        **page_payload(demo_reports, fields, view,
+                       formatter=lambda report, fields: {field: report[field] for field in (fields or report)}),
+        'source': 'demo_data',
+        'message': 'Using demo data - database not available'
+    }
+
 @reports_bp.route('/reports/active', methods=['GET'])
 def get_active_reports():
-    """Get all active reports from database"""
+    """Get active reports from database, newest first, one keyset page at a time"""
     try:
-        # Try to fetch from Supabase first
         try:
-            print("Fetching active reports from Supabase...")
-            result = supabase.table('reports').select('*').eq('status', 'active').order('created_at', desc=True).limit(100).execute()
-            
-            # Log the raw result for debugging
-            print(f"Supabase response: {result}")
+            limit, cursor = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid pagination parameters: {str(e)}'
+            }), 400
+        
+        try:
+            fields, view = parse_view_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid fields or view: {str(e)}'
+            }), 400
+        
+        try:
+            bbox, near = parse_area_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid area filter: {str(e)}'
+            }), 400
+        
+        # Every poller shares one pre-serialized snapshot per page until it
+        # expires or a save or status change invalidates it
+        packed = wants_msgpack()
+        body, etag = active_reports_cache.get_or_build(
+            (packed, request.query_string),
+            lambda: current_app.json.encode(load_active_reports(limit, cursor, fields, view, bbox, near))[0]
+        )
+        
+        response = current_app.response_class(body, mimetype=MSGPACK_MIMETYPE if packed else 'application/json')
+        response.vary.add('Accept')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
             
-            if hasattr(result, 'data') and result.data:
-                reports = []
-                for report in result.data:
-                    try:
-                        # Safely access report data with defaults
-                        report_data = {
-                            'id': report.get('id', str(uuid.uuid4())),  # Generate new ID if missing
-                            'description': report.get('description', 'No description provided'),
-                            'location': report.get('location', 'Location not specified'),
-                            'coordinates': report.get('coordinates', {'lat': 40.7128, 'lng': -74.0060}),
-                            'urgency_level': report.get('urgency_level', 'normal'),
-                            'animal_type': report.get('animal_type'),
-                            'situation_type': report.get('situation_type'),
-                            'created_at': report.get('created_at', datetime.now().isoformat()),
-                            'contact_info': {
-                                'name': report.get('contact_name'),
-                                'email': report.get('contact_email'),
-                                'phone': report.get('contact_phone')
-                            },
-                            'image_url': report.get('image_url'),
-                            'ai_analysis': report.get('ai_analysis')
-                        }
-                        reports.append(report_data)
-                    except Exception as report_error:
-                        print(f"Error processing report: {str(report_error)}")
-                        print(f"Problematic report data: {report}")
-                        continue
-                
-                return jsonify({
-                    'success': True,
-                    'reports': reports,
-                    'total': len(reports)
-                })
-                
+    except Exception as e:
+        print(f"Get Reports Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch reports',
+            'error': str(e)
+        }), 500
+
+def iter_located_rows(status=None, columns='id,lat,lng,coordinates,urgency_level,created_at'):
+    """(row, (lat, lng)) for every report with coordinates, optionally only those with a status"""
+    try:
+        rows, cursor = [], None
+        def fetch():
+            query = supabase.table('reports').select(columns) \
+                .order('created_at', desc=True).order('id', desc=True).limit(1000)
+            if status:
+                query = query.eq('status', status)
+            if cursor:
+                query = query.or_(keyset_filter(cursor))
+            return query.execute()
+
+        while True:
+            page = supabase_breaker.call(fetch).data or []
+            rows.extend(page)
+            if len(page) < 1000:
+                break
+            cursor = (page[-1]['created_at'], page[-1]['id'])
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+        rows = report_store.iter_reports(status=status)
+
+    for row in rows:
+        point = report_point(row)
+        if point:
+            yield row, point
+
+def load_active_points():
+    """(id, lat, lng, urgency_level) for every active report with coordinates"""
+    for row, point in iter_located_rows(status='active'):
+        yield row['id'], point[0], point[1], row.get('urgency_level')
+
+_cluster_build_lock = threading.Lock()
+
+def rebuild_cluster_index():
+    """Reload the cluster index from the database (or the fallback store) unless a rebuild is running"""
+    if not _cluster_build_lock.acquire(blocking=False):
+        return
+    try:
+        marker_clusters.begin_rebuild()
+        marker_clusters.load(load_active_points())
+    except Exception as e:
+        print(f"Cluster rebuild error: {str(e)}")
+    finally:
+        _cluster_build_lock.release()
+
+def ensure_cluster_index():
+    """Build the cluster index on first use and refresh it in the background when it gets old
+
+    Saves and status changes in this process update the index directly;
+    the periodic rebuild picks up changes made by other workers.
+    """
+    if marker_clusters.built_at is None:
+        with _cluster_build_lock:
+            if marker_clusters.built_at is None:
+                marker_clusters.load(load_active_points())
+        return
+
+    max_age = float(os.getenv('CLUSTER_REBUILD_SECONDS', 300))
+    if time.time() - marker_clusters.built_at > max_age and not _cluster_build_lock.locked():
+        threading.Thread(target=rebuild_cluster_index, name='cluster-rebuild', daemon=True).start()
+
+@reports_bp.route('/reports/clusters', methods=['GET'])
+def get_report_clusters():
+    """Marker clusters of active reports for one map zoom level and viewport"""
+    try:
+        zoom = request.args.get('zoom', type=int)
+        if zoom is None or not 0 <= zoom <= 24:
+            return jsonify({
+                'success': False,
+                'message': 'zoom must be an integer between 0 and 24'
+            }), 400
+        
+        try:
+            bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid bbox: {str(e)}'
+            }), 400
+        
+        ensure_cluster_index()
+        clusters = marker_clusters.clusters(zoom, bbox)
+        
+        return jsonify({
+            'success': True,
+            'zoom': zoom,
+            'clusters': clusters,
+            'total': len(clusters),
+            'reports': sum(cluster['count'] for cluster in clusters)
+        })
+        
+    except Exception as e:
+        print(f"Get Clusters Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch clusters',
+            'error': str(e)
+        }), 500
+
+def load_heatmap_points():
+    """(lat, lng, urgency_level, created_at epoch) for every report with coordinates, any status"""
+    for row, point in iter_located_rows():
+        yield point[0], point[1], row.get('urgency_level'), epoch_seconds(row.get('created_at'))
+
+_heatmap_build_lock = threading.Lock()
+
+def rebuild_heatmap():
+    """Reload the heatmap points from the database (or the fallback store) unless a reload is running"""
+    if not _heatmap_build_lock.acquire(blocking=False):
+        return
+    try:
+        report_heatmap.begin_rebuild()
+        report_heatmap.load(load_heatmap_points())
+    except Exception as e:
+        print(f"Heatmap rebuild error: {str(e)}")
+    finally:
+        _heatmap_build_lock.release()
+
+def ensure_heatmap():
+    """Load the heatmap points on first use and reload them in the background when they get old"""
+    if report_heatmap.built_at is None:
+        with _heatmap_build_lock:
+            if report_heatmap.built_at is None:
+                report_heatmap.load(load_heatmap_points())
+        return
+
+    max_age = float(os.getenv('HEATMAP_REBUILD_SECONDS', 300))
+    if time.time() - report_heatmap.built_at > max_age and not _heatmap_build_lock.locked():
+        threading.Thread(target=rebuild_heatmap, name='heatmap-rebuild', daemon=True).start()
+
+def parse_heatmap_args(args):
+    """Read since, until, urgency_level and bins query parameters; raises ValueError on bad input"""
+    def timestamp(name):
+        if not args.get(name):
+            return None
+        value = epoch_seconds(args[name])
+        if value is None:
+            raise ValueError(f'{name} must be an ISO 8601 timestamp')
+        return value
+
+    urgency_levels = tuple(sorted(value.strip() for value in args.get('urgency_level', '').split(',') if value.strip()))
+    unknown = [value for value in urgency_levels if value not in URGENCY_LEVELS]
+    if unknown:
+        raise ValueError(f'urgency_level must be one of: {", ".join(URGENCY_LEVELS)}')
+
+    bins = int(args.get('bins', 64))
+    if not 1 <= bins <= 256:
+        raise ValueError('bins must be between 1 and 256')
+
+    return {
+        'since': timestamp('since'),
+        'until': timestamp('until'),
+        'urgency_levels': urgency_levels or None
+    }, bins
+
+@reports_bp.route('/reports/heatmap/<int:z>/<int:x>/<int:y>.<fmt>', methods=['GET'])
+def get_heatmap_tile(z, x, y, fmt):
+    """Report density for one map tile, as a PNG overlay or a JSON count grid"""
+    try:
+        if fmt not in ('png', 'json') or not tile_in_range(z, x, y):
+            return jsonify({
+                'success': False,
+                'message': 'Tile must be /z/x/y.png or /z/x/y.json with 0 <= z <= 22 and x, y inside the zoom level'
+            }), 404
+        
+        try:
+            filters, bins = parse_heatmap_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid heatmap filters: {str(e)}'
+            }), 400
+        
+        ensure_heatmap()
+        if fmt == 'png':
+            body, etag = report_heatmap.png(z, x, y, **filters)
+            response = current_app.response_class(body, mimetype='image/png')
+        else:
+            body, etag = report_heatmap.grid(z, x, y, bins, **filters)
+            response = current_app.response_class(body, mimetype='application/json')
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        print(f"Heatmap Tile Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to render heatmap tile',
+            'error': str(e)
+        }), 500
+
+def parse_export_args(args):
+    """Read status, urgency_level, since and until query parameters; raises ValueError on bad input"""
+    def choices(name, allowed):
+        values = [value.strip() for value in args.get(name, '').split(',') if value.strip()]
+        unknown = [value for value in values if value not in allowed]
+        if unknown:
+            raise ValueError(f'{name} must be one of: {", ".join(allowed)}')
+        return tuple(values) or None
+
+    def timestamp(name):
+        if not args.get(name):
+            return None
+        try:
+            return datetime.fromisoformat(args[name]).isoformat()
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO 8601 timestamp')
+
+    return {
+        'statuses': choices('status', REPORT_STATUSES),
+        'urgency_levels': choices('urgency_level', URGENCY_LEVELS),
+        'since': timestamp('since'),
+        'until': timestamp('until')
+    }
+
+def iter_export_rows(filters, page_size):
+    """Yield matching reports rows newest first, one keyset page at a time"""
+    cursor = None
+    try:
+        def fetch():
+            query = supabase.table('reports').select('*') \
+                .order('created_at', desc=True).order('id', desc=True).limit(page_size)
+            if filters['statuses']:
+                query = query.in_('status', list(filters['statuses']))
+            if filters['urgency_levels']:
+                query = query.in_('urgency_level', list(filters['urgency_levels']))
+            if filters['since']:
+                query = query.gte('created_at', filters['since'])
+            if filters['until']:
+                query = query.lt('created_at', filters['until'])
+            if cursor:
+                query = query.or_(keyset_filter(cursor))
+            return query.execute()
+
+        while True:
+            rows = supabase_breaker.call(fetch).data or []
+
+            yield from rows
+            if len(rows) < page_size:
+                return
+            cursor = (rows[-1]['created_at'], rows[-1]['id'])
+    except Exception as db_error:
+        # Once rows have gone out the stream cannot switch sources
+        if cursor is not None:
+            raise
+        print(f"Database error: {str(db_error)}")
+
+    # Database unavailable from the start: export the fallback store instead
+    statuses = filters['statuses']
+    single_status = statuses[0] if statuses and len(statuses) == 1 else None
+    before = (filters['until'], '') if filters['until'] else None
+    while True:
+        rows, has_more = report_store.page(status=single_status, before=before, limit=page_size)
+        for row in rows:
+            if filters['since'] and (row.get('created_at') or '') < filters['since']:
+                return
+            if statuses and row.get('status') not in statuses:
+                continue
+            if filters['urgency_levels'] and row.get('urgency_level') not in filters['urgency_levels']:
+                continue
+            yield row
+        if not has_more:
+            return
+        before = (rows[-1].get('created_at') or '', rows[-1]['id'])
+
+@reports_bp.route('/reports/export', methods=['GET'])
+def export_reports():
+    """Stream every matching report, including resolved history, as newline-delimited JSON"""
+    try:
+        filters = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid export filters: {str(e)}'
+        }), 400
+    
+    page_size = int(os.getenv('EXPORT_PAGE_SIZE', 1000))
+    
+    def generate():
+        exported = 0
+        try:
+            for row in iter_export_rows(filters, page_size):
+                yield json.dumps(row, separators=(',', ':'), default=str) + '\n'
+                exported += 1
+        except Exception as e:
+            # Headers are already sent; the missing trailer tells the client the export is incomplete
+            print(f"Export Error after {exported} rows: {str(e)}")
+            return
+        yield json.dumps({'_export_complete': True, 'rows': exported}) + '\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=reports-export.ndjson'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@reports_bp.route('/reports/stream', methods=['GET'])
+def stream_reports():
+    """Server-Sent Events feed of new reports and status changes, optionally limited to a bbox"""
+    try:
+        bbox = parse_bbox(request.args['bbox']) if request.args.get('bbox') else None
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid bbox: {str(e)}'
+        }), 400
+    
+    # Browsers send Last-Event-ID on reconnect; lastEventId lets other clients resume too
+    last_event_id = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('lastEventId'))
+    keepalive = float(os.getenv('REPORT_STREAM_KEEPALIVE_SECONDS', 15))
+    
+    def generate():
+        yield 'retry: 1000\n\n'
+        for event in report_events.listen(last_event_id, keepalive_seconds=keepalive):
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            event_id, event_type, payload = event
+            if event_type == 'reset':
+                yield 'event: reset\ndata: {}\n\n'
+                continue
+            if bbox and not in_area(report_point(payload), bbox):
+                continue
+            yield f"id: {event_id[0]}-{event_id[1]}\nevent: {event_type}\ndata: {json.dumps(payload, default=str)}\n\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+NIL_UUID = '00000000-0000-0000-0000-000000000000'
+
+def encode_watermark(updated, store_position):
+    """Opaque delta sync watermark: the last (updated_at, id) seen in Supabase and the fallback store position"""
+    raw = json.dumps({'u': updated, 's': store_position})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_watermark(watermark):
+    """Return (updated or None, store position or None); raises ValueError if malformed"""
+    try:
+        padded = watermark + '=' * (-len(watermark) % 4)
+        decoded = json.loads(base64.urlsafe_b64decode(padded))
+        updated = tuple(str(value) for value in decoded['u']) if decoded.get('u') else None
+        position = tuple(int(value) for value in decoded['s']) if decoded.get('s') else None
+        if (updated and len(updated) != 2) or (position and len(position) != 2):
+            raise ValueError
+        return updated, position
+    except Exception:
+        raise ValueError('Invalid watermark')
+
+def settled_watermark(updated):
+    """Hold the watermark a few seconds behind now
+
+    updated_at is stamped when a transaction starts, so a slow transaction
+    can commit a row older than one already returned. Keeping the watermark
+    behind means such rows are picked up on the next sync (clients apply
+    changes by id, so seeing a row twice is harmless).
+    """
+    settle = float(os.getenv('CHANGES_SETTLE_SECONDS', 2))
+    horizon = datetime.now(timezone.utc) - timedelta(seconds=settle)
+    try:
+        last = datetime.fromisoformat(updated[0])
+        if last.tzinfo is None:
+            last = last.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return updated
+    return updated if last <= horizon else (horizon.isoformat(), NIL_UUID)
+
+def load_changes(updated, store_position, limit):
+    """Changed reports after a watermark: (active reports, tombstones, has_more, next watermark)"""
+    initial = updated is None and store_position is None
+
+    # Try Supabase first, in (updated_at, id) order
+    try:
+        def fetch():
+            query = supabase.table('reports').select('*') \
+                .order('updated_at').order('id').limit(limit + 1)
+            if initial:
+                # A first sync only needs what is active now
+                query = query.eq('status', 'active')
+            if updated:
+                query = query.or_(f'updated_at.gt."{updated[0]}",and(updated_at.eq."{updated[0]}",id.gt.{updated[1]})')
+            return query.execute()
+        result = supabase_breaker.call(fetch)
+
+        rows = result.data[:limit]
+        has_more = len(result.data) > limit
+        next_updated = (rows[-1]['updated_at'], rows[-1]['id']) if rows else updated
+        if next_updated and not has_more:
+            next_updated = settled_watermark(next_updated)
+        # Rows stored during an outage reach Supabase through the replayer, so later
+        # syncs only need the store from here on
+        return rows, has_more, encode_watermark(next_updated, report_store.position())
+
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+
+    # The store log is in write order, so its position is the watermark
+    rows, position = [], store_position or (1, 0)
+    for record_position, next_position, record in report_store.iter_log(start=position):
+        if len(rows) == limit:
+            return rows, True, encode_watermark(updated, position)
+        position = next_position
+        if not report_store.is_latest(record['id'], record_position):
+            continue  # A newer version follows in the log
+        if initial and record.get('status') != 'active':
+            continue
+        rows.append(record)
+    return rows, False, encode_watermark(updated, position)
+
+@reports_bp.route('/reports/changes', methods=['GET'])
+def get_report_changes():
+    """Reports created or changed since a watermark, plus tombstones for reports no longer active"""
+    try:
+        try:
+            limit, _ = parse_page_args(request.args)
+            fields, _ = parse_view_args(request.args)
+            updated, store_position = decode_watermark(request.args['since']) if request.args.get('since') else (None, None)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid parameters: {str(e)}'
+            }), 400
+        
+        rows, has_more, watermark = load_changes(updated, store_position, limit)
+        
+        reports, removed = [], []
+        for row in rows:
+            if row.get('status', 'active') == 'active':
+                reports.append(format_report(row, fields))
+            else:
+                removed.append({'id': row['id'], 'status': row.get('status'), 'updated_at': row.get('updated_at')})
+        
+        return jsonify({
+            'success': True,
+            'reports': reports,
+            'removed': removed,
+            'has_more': has_more,
+            'watermark': watermark
+        })
+        
+    except Exception as e:
+        print(f"Get Changes Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch report changes',
+            'error': str(e)
+        }), 500
+
+def parse_search_args(args):
+    """Read q, limit and status query parameters; raises ValueError on bad input"""
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise ValueError('q is required')
+    if len(query) > 200:
+        raise ValueError('q must be at most 200 characters')
+
+    limit = int(args.get('limit', 20))
+    if not 1 <= limit <= 100:
+        raise ValueError('limit must be between 1 and 100')
+
+    status = args.get('status') or None
+    if status is not None and status not in REPORT_STATUSES:
+        raise ValueError(f'status must be one of: {", ".join(REPORT_STATUSES)}')
+    return query, limit, status
+
+def search_report_rows(query, limit, status):
+    """[(reports row, rank)] best match first, and the source they came from"""
+    try:
+        result = supabase_breaker.call(lambda: supabase.rpc(
+            'search_reports', {'search_query': query, 'status_filter': status, 'max_results': limit}
+        ).execute())
+        return [(row['report'], row['rank']) for row in result.data or []], 'database'
+    except Exception as db_error:
+        print(f"Database error: {str(db_error)}")
+    
+    # Fallback store: the in-process index only has to read what was appended since the last search
+    report_search_index.catch_up(report_store)
+    rows = []
+    for report_id, rank in report_search_index.search(query, limit, status):
+        report = report_store.get(report_id)
+        if report is not None:
+            rows.append((report, rank))
+    return rows, 'backup_file'
+
+@reports_bp.route('/reports/search', methods=['GET'])
+def search_reports():
+    """Full-text search over report descriptions and locations, best match first"""
+    try:
+        try:
+            query, limit, status = parse_search_args(request.args)
+            fields, _ = parse_view_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f'Invalid search: {str(e)}'
+            }), 400
+        
+        rows, source = search_report_rows(query, limit, status)
+        reports = [{**format_report(row, fields), 'status': row.get('status'), 'rank': rank} for row, rank in rows]
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'reports': reports,
+            'total': len(reports),
+            'source': source
+        })
+        
+    except Exception as e:
+        print(f"Search Reports Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to search reports',
+            'error': str(e)
+        }), 500
+
+@reports_bp.route('/responders/nearest', methods=['GET'])
+def get_nearest_responders():
+    """Nearest registered rescue teams to a point, optionally with a capability"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        k = request.args.get('k', type=int)
+        if parse_coordinates({'lat': lat, 'lng': lng}) is None or (k is not None and not 1 <= k <= 100):
+            return jsonify({
+                'success': False,
+                'message': 'lat and lng are required and k must be between 1 and 100'
+            }), 400
+        
+        teams = responder_registry.nearest(
+            lat, lng,
+            capability=request.args.get('capability') or None,
+            k=k,
+            max_km=request.args.get('max_km', type=float)
+        )
+        
+        return jsonify({
+            'success': True,
+            'teams': teams,
+            'registry': responder_registry.stats()
+        })
+        
+    except Exception as e:
+        print(f"Nearest Responders Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to look up responders',
+            'error': str(e)
+        }), 500
+
+def parse_stats_args(args):
+    """Read group_by, dimension filters, since/until and geohash query parameters; raises ValueError on bad input"""
+    group_by = tuple(name.strip() for name in args.get('group_by', '').split(',') if name.strip())
+    filters = {}
+    for name in STATS_DIMENSIONS:
+        values = [value.strip() for value in args.get(name, '').split(',') if value.strip()]
+        if values:
+            filters[name] = values
+
+    def bucket(name):
+        if not args.get(name):
+            return None
+        try:
+            datetime.fromisoformat(args[name])
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO 8601 timestamp')
+        return hour_bucket(args[name])
+
+    precision = args.get('precision')
+    if precision is not None:
+        precision = int(precision)
+        if not 1 <= precision <= report_stats.geohash_precision:
+            raise ValueError(f'precision must be between 1 and {report_stats.geohash_precision}')
+
+    return {
+        'group_by': group_by,
+        'filters': filters,
+        'since': bucket('since'),
+        'until': bucket('until'),
+        'geohash_prefix': args.get('geohash') or None,
+        'geohash_precision': precision
+    }
+
+@reports_bp.route('/reports/stats', methods=['GET'])
+def get_report_stats():
+    """Report counts grouped by urgency, animal, situation, status, hour, day or geohash"""
+    try:
+        query = parse_stats_args(request.args)
+        groups = report_stats.query(**query)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid stats query: {str(e)}'
+        }), 400
+    
+    try:
+        return jsonify({
+            'success': True,
+            'total': sum(group['count'] for group in groups),
+            'group_by': list(query['group_by']),
+            'groups': groups,
+            'rebuild': report_stats.rebuild_status()
+        })
+    except Exception as e:
+        print(f"Report Stats Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to fetch report stats',
+            'error': str(e)
+        }), 500
+
+@reports_bp.route('/reports/stats/rebuild', methods=['POST'])
+def rebuild_report_stats():
+    """Recount the stats rollups from the full report history in the background"""
+    try:
+        if report_stats.rebuild_status()['running']:
+            return jsonify({
+                'success': False,
+                'message': 'A stats rebuild is already running',
+                'rebuild': report_stats.rebuild_status()
+            }), 409
+        
+        page_size = int(os.getenv('EXPORT_PAGE_SIZE', 1000))
+        filters = {'statuses': None, 'urgency_levels': None, 'since': None, 'until': None}
+        
+        def run():
+            try:
+                report_stats.rebuild(iter_export_rows(filters, page_size))
+            except Exception:
+                pass  # recorded in rebuild_status()
+        
+        threading.Thread(target=run, name='report-stats-rebuild', daemon=True).start()
+        return jsonify({
+            'success': True,
+            'message': 'Stats rebuild started',
+            'rebuild': report_stats.rebuild_status()
+        }), 202
+    except Exception as e:
+        print(f"Stats Rebuild Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to start stats rebuild',
+            'error': str(e)
+        }), 500
+
+@reports_bp.route('/reports/<report_id>/status', methods=['PATCH'])
+def update_report_status(report_id):
+    """Change the status of a report (e.g. resolve it)"""
+    try:
+        data = request.get_json()
+        status = data.get('status') if isinstance(data, dict) else None
+        
+        if status not in REPORT_STATUSES:
+            return jsonify({
+                'success': False,
+                'message': f'status must be one of: {", ".join(REPORT_STATUSES)}'
+            }), 400
+        
+        report = None
+        database_reachable = True
+        source = 'database'
+        try:
+            result = supabase_breaker.call(
+                lambda: supabase.table('reports').update({'status': status}).eq('id', report_id).execute()
+            )
+            if result.data:
+                report = result.data[0]
         except Exception as db_error:
+            database_reachable = False
             print(f"Database error: {str(db_error)}")
         
-        # If database fails, try to load from backup file
-        import json
-        reports_file = 'reports_backup.json'
+        # Reports saved during an outage only exist in the fallback store
+        if report is None:
+            report = report_store.update(report_id, status=status, updated_at=datetime.now().isoformat())
+            source = 'backup_file'
         
-        if os.path.exists(reports_file):
-            try:
-                with open(reports_file, 'r') as f:
-                    backup_reports = json.load(f)
-                
-                # Format backup reports for frontend
-                reports = []
-                for report in backup_reports:
-                    reports.append({
-                        'id': report['id'],
-                        'description': report['description'],
-                        'location': report['location'],
-                        'coordinates': report.get('coordinates', {'lat': 40.7128, 'lng': -74.0060}),
-                        'urgency_level': report.get('urgency_level', 'normal'),
-                        'animal_type': report.get('animal_type'),
-                        'situation_type': report.get('situation_type'),
-                        'created_at': report.get('created_at', datetime.now().isoformat()),
-                        'contact_info': {
-                            'name': report.get('contact_name'),
-                            'email': report.get('contact_email'),
-                            'phone': report.get('contact_phone')
-                        },
-                        'image_url': report.get('image_url'),
-                        'ai_analysis': report.get('ai_analysis')
-                    })
-                
-                return jsonify({
-                    'success': True,
-                    'reports': reports,
-                    'total': len(reports),
-                    'source': 'backup_file'
-                })
-            except Exception as file_error:
-                print(f"Backup file error: {str(file_error)}")
+        if report is None and not database_reachable:
+            return jsonify({
+                'success': False,
+                'message': 'Database unavailable, try again later'
+            }), 503
         
-        # Fallback to demo data for NYC area
-        demo_reports = [
-            {
-                'id': 'demo-001',
-                'description': 'Injured stray dog found in Central Park. Appears to have a leg injury and is limping. The dog seems friendly but scared.',
-                'location': 'Central Park, Manhattan, New York, NY',
-                'coordinates': {'lat': 40.7829, 'lng': -73.9654},
-                'urgency_level': 'high',
-                'animal_type': 'dog',
-                'situation_type': 'injury',
-                'created_at': datetime.now().isoformat(),
-                'contact_info': {
-                    'name': 'Demo Reporter',
-                    'email': 'demo@example.com',
-                    'phone': '+1-555-0123'
-                },
-                'image_url': None,
-                'ai_analysis': {'severity': 'high', 'confidence': 0.85}
-            },
-            {
-                'id': 'demo-002',
-                'description': 'Cat stuck in tree for over 24 hours. Owner reports the cat has not eaten and appears weak.',
-                'location': 'Brooklyn Bridge Park, Brooklyn, NY',
-                'coordinates': {'lat': 40.7023, 'lng': -73.9969},
-                'urgency_level': 'normal',
-                'animal_type': 'cat',
-                'situation_type': 'rescue',
-                'created_at': (datetime.now() - timedelta(hours=2)).isoformat(),
-                'contact_info': {
-                    'name': 'Demo Reporter 2',
-                    'email': 'demo2@example.com',
-                    'phone': '+1-555-0124'
-                },
-                'image_url': None,
-                'ai_analysis': {'severity': 'medium', 'confidence': 0.75}
-            }
-        ]
+        if report is None:
+            return jsonify({
+                'success': False,
+                'message': 'Report not found'
+            }), 404
+        
+        report_events.publish(REPORT_STATUS_CHANGED, report)
         
         return jsonify({
             'success': True,
-            'reports': demo_reports,
-            'total': len(demo_reports),
-            'source': 'demo_data',
-            'message': 'Using demo data - database not available'
+            'report_id': report_id,
+            'status': status,
+            'source': source
         })
-            
+        
     except Exception as e:
-        print(f"Get Reports Error: {str(e)}")
+        print(f"Update Status Error: {str(e)}")
         return jsonify({
             'success': False,
-            'message': 'Failed to fetch reports',
+            'message': 'Failed to update report status',
+            'error': str(e)
+        }), 500
+
+@reports_bp.route('/reports/replay', methods=['GET'])
+def get_replay_status():
+    """Get progress of the fallback store replay into Supabase"""
+    try:
+        return jsonify({
+            'success': True,
+            'replay': backlog_replayer.status()
+        })
+    except Exception as e:
+        print(f"Replay Status Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to get replay status',
+            'error': str(e)
+        }), 500
+
+@reports_bp.route('/reports/replay', methods=['POST'])
+def trigger_replay():
+    """Run a replay pass now instead of waiting for the next interval"""
+    try:
+        if not backlog_replayer.is_database_healthy():
+            return jsonify({
+                'success': False,
+                'message': 'Database is not reachable; replay postponed'
+            }), 503
+        
+        stats = backlog_replayer.replay_once()
+        return jsonify({
+            'success': True,
+            'replayed': stats,
+            'replay': backlog_replayer.status()
+        })
+    except Exception as e:
+        print(f"Replay Error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'Failed to replay backlog',
             'error': str(e)
         }), 500
 
 def send_whatsapp_receipt(phone_number, report_id, description):
     """Send WhatsApp receipt to user using business template"""
     try:
-        from twilio.rest import Client as TwilioClient
-        
-        account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-        auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         from_whatsapp = os.getenv('TWILIO_WHATSAPP_NUMBER')
         
-        client = TwilioClient(account_sid, auth_token)
+        client = outbound_clients.get('twilio')
         
         # Format the message for business template
         # Since we don't have a custom template yet, we'll use a freeform message
@@ -411,3 +1486,83 @@ Reply to this message if you have updates."""
 
 
 
+
+def log_notification_result(job, result):
+    """Record the final outcome of an outbox job in the notifications table"""
+    row = {
+        'report_id': job['report_id'],
+        'notification_type': job['notification_type'],
+        'recipient': job['recipient'],
+        'status': 'sent' if result.get('success') else 'failed',
+        'message_id': result.get('message_id'),
+        'error_message': None if result.get('success') else job.get('last_error'),
+        'sent_at': datetime.now().isoformat() if result.get('success') else None
+    }
+
+    # Reports that only exist in the fallback store get their rows backfilled on replay
+    if not job.get('log_to_db'):
+        report_store.append_notification(row)
+        return
+
+    notification_log.add(row)
+
+# Wire the outbox to the notification senders
+notification_outbox.register_handler('whatsapp_receipt', send_whatsapp_receipt)
+notification_outbox.register_handler('rescue_team_email', send_rescue_team_email)
+notification_outbox.register_handler('user_email_confirmation', send_user_confirmation_email)
+notification_outbox.register_batch_handler('rescue_team_email', send_rescue_team_emails)
+notification_outbox.register_batch_handler('user_email_confirmation', send_user_confirmation_emails)
+notification_outbox.set_result_logger(log_notification_result)
+notification_outbox.set_sent_registry(idempotency_store)
+
+def drop_from_duplicate_index(report):
+    """Only active reports can be the canonical report for a new duplicate"""
+    if report.get('status') != 'active':
+        duplicate_detector.remove(report['id'])
+
+# Keep caches and in-memory indexes in step with saves and status changes
+report_events.subscribe(REPORT_CREATED, lambda report: active_reports_cache.invalidate())
+report_events.subscribe(REPORT_STATUS_CHANGED, lambda report: active_reports_cache.invalidate())
+report_events.subscribe(REPORT_STATUS_CHANGED, drop_from_duplicate_index)
+
+def index_shared_report(report):
+    """Index a report saved by any worker, as read back from the shared event log"""
+    if not duplicate_detector.enabled or report.get('status', 'active') != 'active':
+        return
+    point = report_point(report)
+    created_ts = parse_timestamp(report.get('created_at'))
+    if point and created_ts:
+        duplicate_detector.add(
+            report['id'], point[0], point[1], report.get('description'),
+            duplicate_of=report.get('duplicate_of'), animal_type=report.get('animal_type'), created_ts=created_ts
+        )
+
+# Other workers' saves and status changes reach this worker's duplicate index through the shared log
+report_events.subscribe_shared(REPORT_CREATED, index_shared_report)
+report_events.subscribe_shared(REPORT_STATUS_CHANGED, drop_from_duplicate_index)
+
+def update_cluster_index(report):
+    """Keep an already built cluster index in step with a saved or updated report"""
+    if marker_clusters.built_at is None:
+        return
+    point = report_point(report)
+    if report.get('status', 'active') == 'active' and point:
+        marker_clusters.add(report['id'], point[0], point[1], report.get('urgency_level'))
+    else:
+        marker_clusters.remove(report['id'])
+
+report_events.subscribe(REPORT_CREATED, update_cluster_index)
+report_events.subscribe(REPORT_STATUS_CHANGED, update_cluster_index)
+
+def update_heatmap(report):
+    """Count a new report in an already loaded heatmap"""
+    if report_heatmap.built_at is None:
+        return
+    point = report_point(report)
+    if point:
+        report_heatmap.add(point[0], point[1], report.get('urgency_level'), epoch_seconds(report.get('created_at')))
+
+report_events.subscribe(REPORT_CREATED, update_heatmap)
+
+report_events.subscribe(REPORT_CREATED, report_stats.record)
+report_events.subscribe(REPORT_STATUS_CHANGED, report_stats.record)
@@ -0,0 +1,201 @@
+import re
+import math
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'in', 'is', 'it',
+    'its', 'near', 'of', 'on', 'or', 'the', 'there', 'this', 'to', 'was', 'with'
+))
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(token):
+    """Index form of a lowercased token, or '' for a stopword; a trailing plural 's' is dropped"""
+    if token in STOPWORDS:
+        return ''
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+_normalized = {}
+
+
+def tokenize(text):
+    """Index terms of a text, in order, so 'Dogs near Bandra' gives ['dog', 'bandra']"""
+    if len(_normalized) > 200000:
+        _normalized.clear()
+    terms = []
+    for token in TOKEN_PATTERN.findall((text or '').lower()):
+        term = _normalized.get(token)
+        if term is None:
+            term = _normalized[token] = normalize(token)
+        if term:
+            terms.append(term)
+    return terms
+
+
+class SearchIndex:
+    """In-process inverted index over report descriptions and locations, ranked with BM25
+
+    Each report version gets an integer document number in arrival order,
+    so every posting list (document numbers plus term frequencies, in
+    ``array`` buffers) stays sorted as it grows and is read by NumPy without
+    copying. A changed report gets a new document and its old one is marked
+    dead. All query terms must match: the rarest term's postings are
+    intersected with the others by binary search and scored in one pass.
+    Location terms count ``location_weight`` times.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, location_weight=2.0, statuses=()):
+        self.location_weight = location_weight
+        self.statuses = tuple(statuses)
+
+        self._postings = {}            # term -> (array('i') documents, array('f') weighted frequencies)
+        self._report_ids = []          # document -> report id
+        self._document_of = {}         # report id -> (document, text fingerprint)
+        self._lengths = array('f')     # document -> weighted length
+        self._status = array('b')      # document -> index into statuses, -1 if unknown
+        self._alive = array('b')       # document -> 1 while it is the report's current version
+        self._total_length = 0.0
+        self._live_documents = 0
+        self._lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+        self.position = None           # how far into the source log this index has read
+
+    def __len__(self):
+        return self._live_documents
+
+    def add(self, report):
+        """Index a report, or refresh it if an earlier version was indexed"""
+        self.add_many([report])
+
+    def add_many(self, reports):
+        """Index several reports under one lock acquisition"""
+        statuses, weight = self.statuses, self.location_weight
+        with self._lock:
+            for report in reports:
+                text = (report.get('description') or '', report.get('location') or '')
+                fingerprint = hash(text)
+                status = statuses.index(report['status']) if report.get('status') in statuses else -1
+
+                current = self._document_of.get(report['id'])
+                if current is not None:
+                    if current[1] == fingerprint:
+                        # Same text: only the status can have changed
+                        self._status[current[0]] = status
+                        continue
+                    self._retire(current[0])
+
+                frequencies = Counter(tokenize(text[0]))
+                for term in tokenize(text[1]):
+                    frequencies[term] = frequencies.get(term, 0) + weight
+
+                document = len(self._report_ids)
+                for term, frequency in frequencies.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('i'), array('f'))
+                    postings[0].append(document)
+                    postings[1].append(frequency)
+
+                length = sum(frequencies.values())
+                self._report_ids.append(report['id'])
+                self._document_of[report['id']] = (document, fingerprint)
+                self._lengths.append(length)
+                self._status.append(status)
+                self._alive.append(1)
+                self._total_length += length
+                self._live_documents += 1
+
+    def catch_up(self, store):
+        """Index every report version appended to a ReportStore since the last call"""
+        with self._catch_up_lock:
+            end = store.position()
+            if self.position == end:
+                return 0
+            added, batch = 0, []
+            for _, _, report in store.iter_log(self.position or (1, 0), end):
+                if report.get('id'):
+                    batch.append(report)
+                if len(batch) >= 1000:
+                    self.add_many(batch)
+                    added, batch = added + len(batch), []
+            self.add_many(batch)
+            self.position = end
+            return added + len(batch)
+
+    def search(self, query, limit=20, status=None):
+        """[(report id, score)] of the best matches for every term in query, best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(term) for term in terms]
+            if any(p is None for p in postings) or not self._live_documents:
+                return []
+
+            lengths = np.frombuffer(self._lengths, dtype=np.float32)
+            alive = np.frombuffer(self._alive, dtype=np.int8)
+            statuses = np.frombuffer(self._status, dtype=np.int8)
+            average_length = self._total_length / self._live_documents
+            documents_total = len(self._report_ids)
+
+            # Rarest term first keeps the candidate set small
+            postings.sort(key=lambda p: len(p[0]))
+            candidates, scores = None, None
+            for documents, frequencies in postings:
+                documents = np.frombuffer(documents, dtype=np.int32)
+                frequencies = np.frombuffer(frequencies, dtype=np.float32)
+                if candidates is None:
+                    candidates, matched = documents, frequencies
+                    scores = np.zeros(len(candidates))
+                else:
+                    found = np.minimum(np.searchsorted(documents, candidates), len(documents) - 1)
+                    hit = documents[found] == candidates
+                    candidates, scores, matched = candidates[hit], scores[hit], frequencies[found[hit]]
+                idf = math.log(1 + (documents_total - len(documents) + 0.5) / (len(documents) + 0.5))
+                norm = self.K1 * (1 - self.B + self.B * lengths[candidates] / average_length)
+                scores = scores + idf * matched * (self.K1 + 1) / (matched + norm)
+                if not len(candidates):
+                    return []
+
+            keep = alive[candidates] == 1
+            if status is not None:
+                keep &= statuses[candidates] == (self.statuses.index(status) if status in self.statuses else -2)
+            candidates, scores = candidates[keep], scores[keep]
+
+            if len(candidates) > limit:
+                top = np.argpartition(-scores, limit)[:limit]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(self._report_ids[candidates[i]], round(float(scores[i]), 4)) for i in top]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'reports': self._live_documents,
+                'documents': len(self._report_ids),
+                'terms': len(self._postings),
+                'position': self.position
+            }
+
+    def _retire(self, document):
+        """Mark an old version dead; caller holds the lock"""
+        self._alive[document] = 0
+        self._total_length -= self._lengths[document]
+        self._live_documents -= 1
+
+
+# Global index over the fallback report store
+report_search_index = SearchIndex(statuses=('active', 'in_progress', 'resolved', 'closed'))
@@ -0,0 +1,101 @@
+import os
+import json
+import tempfile
+
+from report_store import ReportStore
+from backlog_replay import BacklogReplayer
+from circuit_breaker import CircuitBreaker
+
+
+class APIError(Exception):
+    """Stands in for postgrest's APIError: the database answered and refused the rows"""
+
+
+class FakeQuery:
+    def __init__(self, client, table, rows):
+        self.client, self.table, self.rows = client, table, rows
+
+    def execute(self):
+        if self.client.down:
+            raise ConnectionError('database unreachable')
+        if any(row.get('reject') for row in self.rows):
+            raise APIError('violates check constraint')
+        self.client.written.setdefault(self.table, []).extend(self.rows)
+
+
+class FakeTable:
+    def __init__(self, client, name):
+        self.client, self.name = client, name
+
+    def insert(self, rows):
+        return FakeQuery(self.client, self.name, rows)
+
+    def upsert(self, rows, on_conflict=None):
+        return FakeQuery(self.client, self.name, rows)
+
+
+class FakeClient:
+    def __init__(self):
+        self.down = False
+        self.written = {}
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def make_replayer(store_dir):
+    store = ReportStore(store_dir=store_dir, legacy_file=None)
+    client = FakeClient()
+    replayer = BacklogReplayer(store=store, batch_size=10)
+    replayer.configure(client, breaker=CircuitBreaker('test', is_failure=lambda e: type(e).__name__ != 'APIError'))
+    return store, client, replayer
+
+
+def test_replayed_reports_get_lat_lng_columns():
+    with tempfile.TemporaryDirectory() as store_dir:
+        store, client, replayer = make_replayer(store_dir)
+        store.append({'id': 'a', 'status': 'active', 'coordinates': {'lat': 19.07, 'lng': 72.87}})
+        store.append({'id': 'b', 'status': 'active', 'coordinates': '(72.80, 19.10)'})
+
+        replayer.replay_once()
+        rows = {row['id']: row for row in client.written['reports']}
+        assert (rows['a']['lat'], rows['a']['lng']) == (19.07, 72.87)
+        assert (rows['b']['lat'], rows['b']['lng']) == (19.10, 72.80)
+
+
+def test_rejected_rows_are_dead_lettered_and_the_checkpoint_moves_on():
+    with tempfile.TemporaryDirectory() as store_dir:
+        store, client, replayer = make_replayer(store_dir)
+        store.append({'id': 'a', 'status': 'active'})
+        store.append_notifications([{'report_id': 'a', 'n': i, 'reject': i == 3} for i in range(25)])
+
+        stats = replayer.replay_once()
+        assert stats['notifications'] == 24
+        assert stats['dead_lettered'] == 1
+        assert not replayer.has_backlog()
+        assert sorted(row['n'] for row in client.written['notifications']) == [i for i in range(25) if i != 3]
+
+        with open(replayer.dead_letter_file) as f:
+            dead = [json.loads(line) for line in f]
+        assert [(entry['table'], entry['row']['n']) for entry in dead] == [('notifications', 3)]
+
+
+def test_outage_keeps_the_checkpoint():
+    with tempfile.TemporaryDirectory() as store_dir:
+        store, client, replayer = make_replayer(store_dir)
+        store.append({'id': 'a', 'status': 'active'})
+        client.down = True
+
+        try:
+            replayer.replay_once()
+        except ConnectionError:
+            pass
+        assert replayer.has_backlog()
+        assert not os.path.exists(replayer.dead_letter_file)
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,50 @@
+import os
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def failing_build():
+    raise ConnectionError('could not build the request')
+
+
+def test_failures_while_building_the_request_trip_the_circuit():
+    breaker = CircuitBreaker('build', failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(lambda: failing_build().execute())
+
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: None)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs os.fork')
+def test_worker_forked_while_open_starts_its_own_prober():
+    breaker = CircuitBreaker('forked', failure_threshold=1, reset_timeout=0.05)
+    breaker.set_probe(lambda: failing_build())
+    with pytest.raises(ConnectionError):
+        breaker.call(failing_build)
+    assert breaker.state == 'open'
+    breaker.set_probe(lambda: None)
+
+    pid = os.fork()
+    if pid == 0:
+        # The parent's probe thread does not exist in the child
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: None)
+        deadline = time.time() + 5
+        while breaker.state != 'closed' and time.time() < deadline:
+            time.sleep(0.01)
+        os._exit(0 if breaker.state == 'closed' else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+if __name__ == '__main__':
+    test_failures_while_building_the_request_trip_the_circuit()
+    test_worker_forked_while_open_starts_its_own_prober()
+    print("circuit breaker tests: ok")
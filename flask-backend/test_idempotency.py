@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+import pytest
+from flask import Flask, jsonify
+
+from idempotency import IdempotencyStore, idempotent
+import idempotency
+
+
+def make_app(store):
+    from response_encoding import FastJSONProvider
+
+    idempotency.idempotency_store = store
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    calls = []
+
+    @app.route('/submit', methods=['POST'])
+    @idempotent('test')
+    def submit():
+        calls.append(1)
+        return jsonify({'success': True, 'call': len(calls)}), 201
+
+    return app, calls
+
+
+def test_msgpack_retry_replays_msgpack():
+    msgpack = pytest.importorskip('msgpack')
+    with tempfile.TemporaryDirectory() as tmp:
+        app, calls = make_app(IdempotencyStore(db_path=os.path.join(tmp, 'keys.db')))
+        client = app.test_client()
+        headers = {'Idempotency-Key': 'k1', 'Accept': 'application/msgpack'}
+
+        first = client.post('/submit', json={'a': 1}, headers=headers)
+        retry = client.post('/submit', json={'a': 1}, headers=headers)
+
+        assert first.mimetype == 'application/msgpack'
+        assert retry.headers['Idempotent-Replayed'] == 'true'
+        assert retry.status_code == 201
+        assert retry.mimetype == 'application/msgpack'
+        assert 'Accept' in retry.headers.get('Vary', '')
+        assert msgpack.unpackb(retry.get_data()) == {'success': True, 'call': 1}
+        assert len(calls) == 1
+
+
+def test_json_retry_replays_json():
+    with tempfile.TemporaryDirectory() as tmp:
+        app, calls = make_app(IdempotencyStore(db_path=os.path.join(tmp, 'keys.db')))
+        client = app.test_client()
+
+        client.post('/submit', json={'a': 1}, headers={'Idempotency-Key': 'k2'})
+        retry = client.post('/submit', json={'a': 1}, headers={'Idempotency-Key': 'k2'})
+
+        assert retry.mimetype == 'application/json'
+        assert retry.get_json() == {'success': True, 'call': 1}
+        assert len(calls) == 1
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,25 @@
+import tempfile
+
+from report_events import ReportEvents, REPORT_CREATED, REPORT_STATUS_CHANGED
+
+
+def test_shared_handlers_see_events_from_other_workers():
+    """Two hubs on one log directory stand in for two gunicorn workers"""
+    with tempfile.TemporaryDirectory() as log_dir:
+        worker_a = ReportEvents(log_dir=log_dir, poll_interval=60)
+        worker_b = ReportEvents(log_dir=log_dir, poll_interval=60)
+        seen = []
+        worker_b.subscribe_shared(REPORT_CREATED, lambda report: seen.append(('created', report['id'])))
+        worker_b.subscribe_shared(REPORT_STATUS_CHANGED, lambda report: seen.append((report['status'], report['id'])))
+        worker_b.refresh()
+
+        worker_a.publish(REPORT_CREATED, {'id': 'r1', 'status': 'active', 'phone_number': '+100'})
+        worker_a.publish(REPORT_STATUS_CHANGED, {'id': 'r1', 'status': 'resolved'})
+        worker_b.refresh()
+
+        assert seen == [('created', 'r1'), ('resolved', 'r1')]
+
+
+if __name__ == '__main__':
+    test_shared_handlers_see_events_from_other_workers()
+    print("test_shared_handlers_see_events_from_other_workers: ok")
@@ -0,0 +1,134 @@
+import os
+import json
+import tempfile
+import sys
+import threading
+
+from report_store import ReportStore
+
+
+def make_report(report_id, status='active', created_at='2024-01-01T00:00:00'):
+    return {'id': report_id, 'status': status, 'created_at': created_at, 'description': f'report {report_id}'}
+
+
+def test_torn_trailing_line_is_truncated_before_next_save():
+    """A writer that died mid-line must not break later saves, reads or reopening the store"""
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = ReportStore(store_dir=store_dir, legacy_file=None)
+        store.append(make_report('a'))
+        store.sync()
+
+        # Simulate a crash halfway through writing the next record
+        with open(store._segment_path(1), 'ab') as f:
+            f.write(b'{"id":"torn","status":"act')
+
+        store.append(make_report('b'))
+        store.sync()
+        assert store.get('a')['id'] == 'a'
+        assert store.get('b')['id'] == 'b'
+        assert store.get('torn') is None
+
+        reopened = ReportStore(store_dir=store_dir, legacy_file=None)
+        assert reopened.count() == 2
+        assert reopened.get('b')['description'] == 'report b'
+        assert [record['id'] for _, _, record in reopened.iter_log()] == ['a', 'b']
+
+        reopened.append(make_report('c'))
+        assert store.get('c')['id'] == 'c'
+
+
+def test_record_appended_after_torn_line_is_recovered():
+    """Stores already written past a torn line keep the records that follow it"""
+    with tempfile.TemporaryDirectory() as store_dir:
+        os.makedirs(store_dir, exist_ok=True)
+        path = os.path.join(store_dir, 'segment-000001.jsonl')
+        with open(path, 'wb') as f:
+            f.write(json.dumps(make_report('a')).encode() + b'\n')
+            f.write(b'{"id":"torn","sta' + json.dumps(make_report('b')).encode() + b'\n')
+            f.write(b'not json at all\n')
+
+        store = ReportStore(store_dir=store_dir, legacy_file=None)
+        assert store.count() == 2
+        assert store.get('b')['id'] == 'b'
+
+        store.append(make_report('c'))
+        assert ReportStore(store_dir=store_dir, legacy_file=None).get('c')['id'] == 'c'
+
+
+def test_torn_notification_row_is_truncated_before_next_append():
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = ReportStore(store_dir=store_dir, legacy_file=None)
+        store.append_notification({'report_id': 'a'})
+        with open(os.path.join(store_dir, 'notifications.jsonl'), 'a') as f:
+            f.write('{"report_id": "to')
+
+        store.append_notification({'report_id': 'b'})
+        assert [row['report_id'] for _, row in store.iter_notifications()] == ['a', 'b']
+
+
+def test_status_pages_follow_status_changes():
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = ReportStore(store_dir=store_dir, segment_bytes=2048, legacy_file=None)
+        for i in range(60):
+            store.append(make_report(f'r{i:02d}', created_at=f'2024-01-01T00:{i:02d}:00'))
+        for i in range(0, 60, 3):
+            store.update(f'r{i:02d}', status='resolved')
+        store.update('r03', status='active')
+
+        for reader in (store, ReportStore(store_dir=store_dir, segment_bytes=2048, legacy_file=None)):
+            for status in ('active', 'resolved', None):
+                expected = [report['id'] for report in reader.iter_reports()
+                            if status is None or report['status'] == status]
+                seen, before = [], None
+                while True:
+                    reports, has_more = reader.page(status=status, before=before, limit=7)
+                    seen += [report['id'] for report in reports]
+                    if not has_more:
+                        break
+                    before = (reports[-1]['created_at'], reports[-1]['id'])
+                assert seen == expected
+            assert reader.count('resolved') == 19
+
+
+def test_readers_racing_a_writer_never_lose_records():
+    """Reader threads catching up while another thread appends must not double count a record"""
+    with tempfile.TemporaryDirectory() as store_dir:
+        store = ReportStore(store_dir=store_dir, legacy_file=None)
+        store.append(make_report('seed'))
+        done = threading.Event()
+        errors = []
+
+        def read():
+            while not done.is_set():
+                try:
+                    store.count()
+                    store.position()
+                except Exception as e:
+                    errors.append(e)
+
+        # Switch threads as often as possible so readers land between a write and its offset update
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for i in range(3000):
+                store.append(make_report(f'r{i}'))
+        finally:
+            done.set()
+            sys.setswitchinterval(interval)
+            for reader in readers:
+                reader.join()
+
+        assert not errors
+        assert store.position() == (1, os.path.getsize(store._segment_path(1)))
+        assert all(store.get(f'r{i}') is not None for i in range(3000))
+        assert ReportStore(store_dir=store_dir, legacy_file=None).count() == 3001
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")